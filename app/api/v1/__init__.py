@@ -1,9 +1,10 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import frames, register, status, questions
+from app.api.v1.endpoints import frames, register, status, questions, metrics
 
 api_router = APIRouter()
 
 api_router.include_router(register.router, prefix="/register")
 api_router.include_router(frames.router, prefix="/frames")
 api_router.include_router(status.router, prefix="/status")
-api_router.include_router(questions.router, prefix="/questions", tags=["Questions"])
\ No newline at end of file
+api_router.include_router(questions.router, prefix="/questions", tags=["Questions"])
+api_router.include_router(metrics.router, prefix="/metrics")
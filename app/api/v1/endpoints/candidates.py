@@ -1,7 +1,8 @@
+from bson import ObjectId
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from datetime import datetime
-import app.db.session as db_session
+from app.db import repositories
 from pymongo import errors
 
 router = APIRouter()
@@ -11,15 +12,16 @@ class CandidateRegister(BaseModel):
 
 @router.post("/register-candidate/")
 async def register_candidate(data: CandidateRegister):
-    db = db_session.get_db()
-    if db is None:
-        raise HTTPException(status_code=503, detail="Database unavailable. Please ensure MongoDB is running.")
+    # The returned ID is stored as candidate_id too, which is what sessions look up
+    candidate_oid = ObjectId()
     candidate = {
+        "_id": candidate_oid,
+        "candidate_id": str(candidate_oid),
         "name": data.name,
         "registered_at": datetime.utcnow()
     }
     try:
-        result = db["candidates"].insert_one(candidate)
+        result = await repositories.insert_candidate(candidate)
     except errors.PyMongoError as e:
         raise HTTPException(status_code=500, detail=f"Failed to register candidate: {str(e)}")
     return {
@@ -1,27 +1,31 @@
-from collections import deque
-from fastapi import APIRouter, HTTPException, Form, UploadFile
+from collections import namedtuple
+import asyncio
+from fastapi import APIRouter, HTTPException, Form, UploadFile, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 import numpy as np
-import cv2
 import base64
 import binascii
-from datetime import datetime, timedelta
-import csv
+from datetime import datetime
 import os
 import logging
-import filelock
-import time
 from pathlib import Path
+from typing import List, Optional
 
 
+from pymongo import UpdateOne
 from pymongo.errors import PyMongoError
-from app.db.session import db
-from app.utils.mediapipe_handler import MediaPipeFaceMesh
-from app.utils.head_pose_estimator import HeadPoseEstimator
-from app.utils.yolo_handler import get_yolo_results, detect_mobile_from_yolo, count_people
+from app.db.event_sink import event_sink
+from app.db.violation_store import record_violation
+from app.db import repositories
+from app.utils.inference_pool import inference_pool, FrameAnalysis, FrameDecodeError
+from app.utils.head_pose_estimator import rotation_to_euler
+from app.utils.mediapipe_handler import landmarks_to_dicts, encode_landmarks
 from app.utils.logger import log_cheating_to_mongo
+from app.utils.log_sink import pose_log_sink
 from app.utils.pose_rules import check_pose_violation
+from app.utils.candidate_sessions import open_session, run_session, CandidateSession, MAX_WARNINGS
 from app.utils.violation_handler import disqualify_candidate
 
 # Configure logging
@@ -39,31 +43,54 @@ router = APIRouter()
 
 # Constants
 MAX_IMAGE_SIZE = 10 * 1024 * 1024  # 10MB
-CSV_FILE = "app/logs/pose_logs.csv"
+MULTIPART_OVERHEAD = 64 * 1024  # boundaries, part headers and the candidate_id field
 RECORDINGS_DIR = "app/recordings"
 
-# Initialize models with error handling
-try:
-    pose_estimator = HeadPoseEstimator()
-    face_analyzer = MediaPipeFaceMesh()
-except Exception as e:
-    logger.error(f"Failed to initialize models: {str(e)}")
-    raise RuntimeError("Failed to initialize required models") from e
-
-# Global session trackers
-cheating_lookaway_start = {}
-face_not_detected_counter = {}
-violation_count = {}
-pause_until = {}
-rolling_window = {}  # candidate_id -> deque of (yaw, pitch)
-
 # Ensure directories exist
-os.makedirs(os.path.dirname(CSV_FILE), exist_ok=True)
 os.makedirs(RECORDINGS_DIR, exist_ok=True)
 
 class FramePayload(BaseModel):
     candidate_id: str
     image: str  # base64 string
+    landmarks: str = "none"  # none | compact | full
+    landmark_indices: Optional[List[int]] = None
+
+# Landmarks are opt-in: "compact" is a quantized int16 base64 array,
+# "full" is the legacy list of {x, y, z} dicts plus landmarks_sample
+LANDMARK_MODES = {"none", "compact", "full"}
+MAX_LANDMARK_INDEX = 477  # FaceMesh with refine_landmarks=True returns 478 points
+
+LandmarkOptions = namedtuple("LandmarkOptions", ["mode", "indices"])
+
+def parse_landmark_options(mode: str, indices) -> LandmarkOptions:
+    mode = (mode or "none").lower()
+    if mode not in LANDMARK_MODES:
+        raise HTTPException(status_code=400, detail=f"landmarks must be one of {sorted(LANDMARK_MODES)}")
+    if isinstance(indices, str):
+        try:
+            indices = [int(i) for i in indices.split(",") if i.strip()]
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail="landmark_indices must be comma-separated integers") from e
+    if indices:
+        if any(i < 0 or i > MAX_LANDMARK_INDEX for i in indices):
+            raise HTTPException(status_code=400, detail=f"landmark_indices must be within 0..{MAX_LANDMARK_INDEX}")
+        if mode == "none":
+            mode = "compact"
+    return LandmarkOptions(mode, indices or None)
+
+def shape_landmarks(response_data: dict, landmarks: np.ndarray, options: LandmarkOptions):
+    if options.mode == "compact":
+        response_data["landmarks"] = encode_landmarks(landmarks, options.indices)
+    elif options.mode == "full":
+        selected = landmarks if options.indices is None else landmarks[options.indices]
+        response_data["all_landmarks"] = landmarks_to_dicts(selected)
+        if options.indices is None:
+            response_data["landmarks_sample"] = {
+                "nose_tip": response_data["all_landmarks"][1],
+                "left_eye_outer": response_data["all_landmarks"][33]
+            }
+        else:
+            response_data["landmark_indices"] = options.indices
 
 def extract_base64(image_str: str) -> str:
     if image_str.startswith("data:image"):
@@ -79,23 +106,57 @@ def validate_image_size(encoded: str):
     size = (len(encoded) * 3) / 4
     if size > MAX_IMAGE_SIZE:
         logger.warning(f"Image too large: {size / 1024 / 1024:.2f}MB")
-        raise HTTPException(
-            status_code=413,
-            detail=f"Image too large (max {MAX_IMAGE_SIZE / 1024 / 1024}MB)"
-        )
-
-def log_to_csv(data: list):
-    lock = filelock.FileLock(f"{CSV_FILE}.lock")
-    try:
-        with lock:
-            with open(CSV_FILE, mode='a', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow(data)
-    except Exception as e:
-        logger.error(f"CSV write failed: {str(e)}")
+        raise image_too_large()
+
+def image_too_large():
+    return HTTPException(
+        status_code=413,
+        detail=f"Image too large (max {MAX_IMAGE_SIZE / 1024 / 1024}MB)"
+    )
+
+def check_paused(state: CandidateSession, now: datetime):
+    remaining = state.pause_remaining(now)
+    if remaining is not None:
+        return {
+            "status": "paused",
+            "message": f"Test paused for {remaining} seconds due to repeated cheating.",
+            "remaining_seconds": remaining
+        }
+    return None
+
+async def read_limited_body(request: Request, limit: int = MAX_IMAGE_SIZE) -> bytearray:
+    """Read the raw request body, aborting with 413 as soon as it exceeds limit bytes."""
+    buffer = bytearray()
+    async for chunk in request.stream():
+        buffer.extend(chunk)
+        if len(buffer) > limit:
+            logger.warning(f"Image too large: more than {limit / 1024 / 1024:.2f}MB streamed")
+            raise image_too_large()
+    return buffer
+
+async def read_limited_form(request: Request):
+    """
+    Parse a multipart body only after it has been streamed in under the size
+    limit; request.form() alone would spool any amount to disk first.
+    """
+    body = bytes(await read_limited_body(request, MAX_IMAGE_SIZE + MULTIPART_OVERHEAD))
+
+    async def replay():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return await Request(request.scope, replay).form(max_files=1, max_fields=10)
+
+async def read_limited_upload(upload: UploadFile) -> bytearray:
+    buffer = bytearray()
+    while chunk := await upload.read(256 * 1024):
+        buffer.extend(chunk)
+        if len(buffer) > MAX_IMAGE_SIZE:
+            logger.warning(f"Image part too large: more than {MAX_IMAGE_SIZE / 1024 / 1024:.2f}MB")
+            raise image_too_large()
+    return buffer
 
 @router.post("/", tags=["Frames"], operation_id="upload_candidate_frame")
-def upload_candidate_frame(payload: FramePayload):
+async def upload_candidate_frame(payload: FramePayload):
     logger.info(f"Received frame from {payload.candidate_id}")
 
     now = datetime.now()
@@ -104,31 +165,94 @@ def upload_candidate_frame(payload: FramePayload):
     if not candidate_id or len(candidate_id) > 100:
         raise HTTPException(status_code=400, detail="Invalid candidate ID")
 
-    if candidate_id in pause_until and now < pause_until[candidate_id]:
-        remaining = int((pause_until[candidate_id] - now).total_seconds())
-        return JSONResponse(
-            status_code=200,
-            content={
-                "status": "paused",
-                "message": f"Test paused for {remaining} seconds due to repeated cheating.",
-                "remaining_seconds": remaining
-            }
-        )
+    landmark_options = parse_landmark_options(payload.landmarks, payload.landmark_indices)
+    state = await open_session(candidate_id)
+    paused = await run_session(check_paused, state, now)
+    if paused is not None:
+        return paused
+
+    encoded = extract_base64(payload.image)
+    validate_image_size(encoded)
 
     try:
-        encoded = extract_base64(payload.image)
-        validate_image_size(encoded)
+        img_bytes = base64.b64decode(encoded)
+    except (binascii.Error, ValueError) as e:
+        logger.error(f"Base64 decode error: {str(e)}")
+        raise HTTPException(status_code=400, detail="Invalid image data") from e
+
+    return await process_frame(candidate_id, img_bytes, now, state, landmark_options)
+
+
+@router.post("/binary", tags=["Frames"], operation_id="upload_candidate_frame_binary")
+async def upload_candidate_frame_binary(
+    request: Request,
+    candidate_id: Optional[str] = None,
+    landmarks: str = "none",
+    landmark_indices: Optional[str] = None
+):
+    """
+    Binary variant of upload_candidate_frame. Accepts either a raw image body
+    (Content-Type image/jpeg, image/png or application/octet-stream) with the
+    candidate ID in the ``candidate_id`` query parameter or ``X-Candidate-Id``
+    header, or multipart/form-data with ``candidate_id`` and an ``image`` part.
+    Landmark shaping is controlled by the ``landmarks`` and comma-separated
+    ``landmark_indices`` query parameters.
+    """
+    landmark_options = parse_landmark_options(landmarks, landmark_indices)
+    content_length = request.headers.get("content-length")
+    content_type = request.headers.get("content-type", "").split(";", 1)[0].strip().lower()
+    limit = MAX_IMAGE_SIZE + (MULTIPART_OVERHEAD if content_type == "multipart/form-data" else 0)
+    if content_length and content_length.isdigit() and int(content_length) > limit:
+        raise image_too_large()
+
+    candidate_id = candidate_id or request.headers.get("x-candidate-id")
+
+    if content_type == "multipart/form-data":
+        form = await read_limited_form(request)
+        candidate_id = candidate_id or form.get("candidate_id")
+        image_part = form.get("image")
+        if image_part is None or isinstance(image_part, str):
+            raise HTTPException(status_code=400, detail="Missing image part")
+        buffer = await read_limited_upload(image_part)
+    elif content_type.startswith("image/") or content_type == "application/octet-stream":
+        buffer = await read_limited_body(request)
+    else:
+        raise HTTPException(status_code=415, detail="Expected an image body or multipart/form-data")
+
+    logger.info(f"Received binary frame from {candidate_id}")
+    if not candidate_id or len(candidate_id) > 100:
+        raise HTTPException(status_code=400, detail="Invalid candidate ID")
 
-        try:
-            img_bytes = base64.b64decode(encoded)
-            nparr = np.frombuffer(img_bytes, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            if img is None:
-                raise HTTPException(status_code=400, detail="Could not decode image")
-        except (binascii.Error, ValueError) as e:
-            logger.error(f"Base64 decode error: {str(e)}")
-            raise HTTPException(status_code=400, detail="Invalid image data") from e
+    now = datetime.now()
+    state = await open_session(candidate_id)
+    paused = await run_session(check_paused, state, now)
+    if paused is not None:
+        return paused
 
+    return await process_frame(candidate_id, buffer, now, state, landmark_options)
+
+
+async def process_frame(candidate_id: str, buffer, now: datetime, state: CandidateSession,
+                        landmark_options: Optional[LandmarkOptions] = None):
+    """
+    Analyse an encoded frame on the inference pool, then apply the
+    warning/pause/ban logic (which does blocking I/O) in the threadpool.
+    """
+    try:
+        analysis = await inference_pool.analyze(candidate_id, buffer)
+    except FrameDecodeError as e:
+        raise HTTPException(status_code=400, detail="Could not decode image") from e
+    except Exception as e:
+        logger.error(f"Frame inference failed: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error") from e
+
+    return await run_in_threadpool(apply_frame_analysis, candidate_id, analysis, now, state, landmark_options)
+
+
+def apply_frame_analysis(candidate_id: str, analysis: FrameAnalysis, now: datetime, state: CandidateSession,
+                         landmark_options: Optional[LandmarkOptions] = None):
+    """Turn one frame's model output into a verdict and update the candidate's counters."""
+    try:
         response_data = {
             "status": "running",
             "timestamp": now.isoformat(),
@@ -138,93 +262,65 @@ def upload_candidate_frame(payload: FramePayload):
             "cheating": False,
             "reason": "Normal processing",
             "warning": None,
-            "landmarks_sample": {},
-            "all_landmarks": []
+            "reused": analysis.reused  # previous analysis reused for an unchanged frame
         }
 
-        try:
-            results = get_yolo_results(img)
-            if detect_mobile_from_yolo(results):
-                db["result"].update_one(
-                    {"candidate_id": candidate_id},
-                    {"$set": {
-                        "result": "Fail",
-                        "test_completed": True,
-                        "banned": True,
-                        "disqualified_reason": "Mobile phone detected",
-                        "completed_at": datetime.utcnow()
-                    }},
-                    upsert=True
-                )
-                log_cheating_to_mongo(candidate_id, candidate_id, "Mobile phone detected", {"violation_type": "mobile"})
-                return JSONResponse(
-                    status_code=200,
-                    content={
-                        "status": "banned",
-                        "message": "🚫 Disqualified: Mobile phone detected.",
-                        "cheating": True,
-                        "reason": "Mobile phone detected"
-                    }
-                )
-            if count_people(results) > 1:
-                response_data.update({
-                    "cheating": True,
-                    "reason": "Multiple people detected"
-                })
-        except Exception as e:
-            logger.error(f"YOLO processing failed: {str(e)}")
+        if analysis.mobile_detected:
+            event_sink.write_now("result", UpdateOne(
+                {"candidate_id": candidate_id},
+                {"$set": {
+                    "result": "Fail",
+                    "test_completed": True,
+                    "banned": True,
+                    "disqualified_reason": "Mobile phone detected",
+                    "completed_at": datetime.utcnow()
+                }},
+                upsert=True
+            ))
+            log_cheating_to_mongo(candidate_id, candidate_id, "Mobile phone detected", {"violation_type": "mobile"})
+            inference_pool.release(candidate_id)
+            return {
+                "status": "banned",
+                "message": "🚫 Disqualified: Mobile phone detected.",
+                "cheating": True,
+                "reason": "Mobile phone detected"
+            }
+        if analysis.people_count > 1:
+            response_data.update({
+                "cheating": True,
+                "reason": "Multiple people detected"
+            })
 
         smoothed_yaw = smoothed_pitch = roll = None
+        face_failures = None
         try:
-            logger.info(f"Processing image of shape {img.shape}")
-            landmarks = face_analyzer.get_all_landmarks(img)
-            if not landmarks:
-                logger.warning("First face detection attempt failed, retrying...")
-                time.sleep(0.1)
-                landmarks = face_analyzer.get_all_landmarks(img)
-
-            if not landmarks or len(landmarks) < 468:
-                raise ValueError(f"Only {len(landmarks) if landmarks else 0} landmarks detected (need 468)")
-
-            response_data["all_landmarks"] = landmarks
-            if len(landmarks) > 33:
-                response_data["landmarks_sample"] = {
-                    "nose_tip": landmarks[1],
-                    "left_eye_outer": landmarks[33]
-                }
-
-            rvec, tvec, _ = pose_estimator.estimate_pose(img)
-            if rvec is None:
-                raise ValueError("Pose estimation failed (rvec is None)")
+            logger.info(f"Processing image of shape {analysis.image_shape}")
+            if analysis.face_error:
+                raise RuntimeError(analysis.face_error)
 
-            rotation_matrix, _ = cv2.Rodrigues(rvec)
-            sy = np.sqrt(rotation_matrix[0, 0] ** 2 + rotation_matrix[1, 0] ** 2)
-            singular = sy < 1e-6
+            landmark_count = len(analysis.landmarks) if analysis.landmarks is not None else 0
+            if landmark_count < 468:
+                raise ValueError(f"Only {landmark_count} landmarks detected (need 468)")
 
-            if not singular:
-                pitch = np.arctan2(rotation_matrix[2, 1], rotation_matrix[2, 2])
-                yaw = np.arctan2(-rotation_matrix[2, 0], sy)
-                roll = np.arctan2(rotation_matrix[1, 0], rotation_matrix[0, 0])
-            else:
-                pitch = np.arctan2(-rotation_matrix[1, 2], rotation_matrix[1, 1])
-                yaw = np.arctan2(-rotation_matrix[2, 0], sy)
-                roll = 0
+            if landmark_options is not None and landmark_options.mode != "none":
+                shape_landmarks(response_data, analysis.landmarks, landmark_options)
 
-            yaw = round(np.degrees(yaw), 2)
-            pitch = round(np.degrees(pitch), 2)
-            roll = round(np.degrees(roll), 2)
+            if analysis.rvec is None:
+                raise ValueError("Pose estimation failed (rvec is None)")
+
+            yaw, pitch, roll = rotation_to_euler(analysis.rvec)
+            yaw = round(yaw, 2)
+            pitch = round(pitch, 2)
+            roll = round(roll, 2)
             if abs(roll) > 75:
                 roll = 0
 
-            if candidate_id not in rolling_window:
-                rolling_window[candidate_id] = deque(maxlen=10)
-            rolling_window[candidate_id].append((yaw, pitch))
-
-            smoothed_yaw = round(np.mean([y for y, _ in rolling_window[candidate_id]]), 2)
-            smoothed_pitch = round(np.mean([p for _, p in rolling_window[candidate_id]]), 2)
+            smoothed_yaw, smoothed_pitch = state.add_pose(yaw, pitch)
+            smoothed_yaw = round(smoothed_yaw, 2)
+            smoothed_pitch = round(smoothed_pitch, 2)
 
             if smoothed_yaw is not None and smoothed_pitch is not None and roll is not None:
-                violation_reason = check_pose_violation(candidate_id, smoothed_yaw, smoothed_pitch, roll, now)
+                violation_reason = check_pose_violation(state, smoothed_yaw, smoothed_pitch, roll, now)
                 if violation_reason:
                     response_data.update({
                         "cheating": True,
@@ -237,9 +333,9 @@ def upload_candidate_frame(payload: FramePayload):
             })
         except ValueError as e:
             logger.warning(f"Face detection issue: {str(e)}")
-            face_not_detected_counter[candidate_id] = face_not_detected_counter.get(candidate_id, 0) + 1
+            face_failures = state.record_face_failure()
             warning_msg = "Face not clearly visible - please adjust position"
-            if face_not_detected_counter[candidate_id] >= 3:
+            if face_failures >= 3:
                 warning_msg = "Repeated face detection failures"
                 response_data.update({
                     "cheating": True,
@@ -264,15 +360,14 @@ def upload_candidate_frame(payload: FramePayload):
                 "cheating": False
             })
 
-        response_data["face_detection_failures"] = face_not_detected_counter.get(candidate_id, 0)
+        response_data["face_detection_failures"] = face_failures if face_failures is not None else state.face_failures()
 
         if response_data["cheating"]:
-            count = violation_count.get(candidate_id, 0) + 1
-            violation_count[candidate_id] = count
+            # Counts the violation and starts the 30s pause for warnings
+            count = state.record_violation(now)
 
-            if count <= 2:
+            if count <= MAX_WARNINGS:
                 response_data["warning"] = f"Warning {count}: {response_data['reason']}"
-                pause_until[candidate_id] = now + timedelta(seconds=30)
             else:
                 success = disqualify_candidate(
                     candidate_id,
@@ -286,30 +381,26 @@ def upload_candidate_frame(payload: FramePayload):
                     }
                 )
                 if success:
-                    return JSONResponse(
-                        status_code=200,
-                        content={
-                            "status": "banned",
-                            "message": "❌ You are disqualified. Test ended due to repeated violations.",
-                            "cheating": True,
-                            "reason": response_data["reason"],
-                            "violation_count": count
-                        }
-                    )
+                    inference_pool.release(candidate_id)
+                    return {
+                        "status": "banned",
+                        "message": "❌ You are disqualified. Test ended due to repeated violations.",
+                        "cheating": True,
+                        "reason": response_data["reason"],
+                        "violation_count": count
+                    }
 
-        try:
-            log_to_csv([
-                now.isoformat(),
-                candidate_id,
-                response_data["yaw"],
-                response_data["pitch"],
-                response_data["roll"],
-                response_data["cheating"],
-                response_data["reason"],
-                response_data["warning"] or ""
-            ])
-        except Exception as e:
-            logger.error(f"CSV logging failed: {str(e)}")
+        # Buffered in memory; a background thread writes it out in batches
+        pose_log_sink.write({
+            "timestamp": now,
+            "candidate_id": candidate_id,
+            "yaw": response_data["yaw"],
+            "pitch": response_data["pitch"],
+            "roll": response_data["roll"],
+            "cheating": response_data["cheating"],
+            "reason": response_data["reason"],
+            "warning": response_data["warning"] or ""
+        })
 
         return response_data
 
@@ -320,6 +411,106 @@ def upload_candidate_frame(payload: FramePayload):
         raise HTTPException(status_code=500, detail="Internal server error") from e
 
 
+# Verdict fields sent over the streaming socket (landmarks are never streamed)
+STREAM_VERDICT_FIELDS = (
+    "status", "message", "cheating", "reason", "warning", "yaw", "pitch", "roll",
+    "remaining_seconds", "violation_count", "face_detection_failures"
+)
+
+def compact_verdict(result: dict) -> dict:
+    verdict = {"type": "verdict"}
+    verdict.update({k: result[k] for k in STREAM_VERDICT_FIELDS if result.get(k) is not None})
+    return verdict
+
+async def analyze_frame_bytes(candidate_id: str, buffer) -> dict:
+    now = datetime.now()
+    # Looked up per frame so the registry sees the session as active; the
+    # candidate was checked against Mongo when the socket connected
+    state = await open_session(candidate_id, registered=True)
+    paused = await run_session(check_paused, state, now)
+    if paused is not None:
+        return paused
+    return await process_frame(candidate_id, buffer, now, state)
+
+
+@router.websocket("/ws/{candidate_id}")
+async def stream_candidate_frames(websocket: WebSocket, candidate_id: str):
+    """
+    Streaming variant of upload_candidate_frame. The client sends each webcam
+    frame as one binary JPEG message and receives a compact JSON verdict per
+    analysed frame. Only the newest unprocessed frame is kept: when frames
+    arrive faster than they are analysed, older ones are dropped and the next
+    verdict is preceded by a ``{"type": "throttle", "dropped": n}`` message
+    telling the client to lower its capture rate.
+    """
+    if not candidate_id or len(candidate_id) > 100:
+        await websocket.close(code=1008)  # policy violation
+        return
+    try:
+        await open_session(candidate_id)
+    except HTTPException as e:
+        # Unknown candidate: policy violation; registry full or Mongo down: try again later
+        await websocket.close(code=1008 if e.status_code == 404 else 1013, reason=str(e.detail))
+        return
+
+    await websocket.accept()
+    logger.info(f"Frame stream opened for {candidate_id}")
+
+    pending = {"frame": None, "dropped": 0, "closed": False}
+    frame_ready = asyncio.Event()
+
+    async def receive_frames():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                frame = message.get("bytes")
+                if not frame:
+                    continue
+                if len(frame) > MAX_IMAGE_SIZE:
+                    pending["dropped"] += 1
+                    continue
+                if pending["frame"] is not None:
+                    pending["dropped"] += 1
+                pending["frame"] = frame
+                frame_ready.set()
+        finally:
+            pending["closed"] = True
+            frame_ready.set()
+
+    receiver = asyncio.create_task(receive_frames())
+    try:
+        while True:
+            await frame_ready.wait()
+            frame_ready.clear()
+            if pending["closed"]:
+                break
+            frame, pending["frame"] = pending["frame"], None
+            if frame is None:
+                continue
+
+            if pending["dropped"]:
+                await websocket.send_json({"type": "throttle", "dropped": pending["dropped"]})
+                pending["dropped"] = 0
+
+            try:
+                result = await analyze_frame_bytes(candidate_id, frame)
+            except HTTPException as e:
+                await websocket.send_json({"type": "error", "status_code": e.status_code, "detail": e.detail})
+                continue
+
+            await websocket.send_json(compact_verdict(result))
+            if result.get("status") == "banned":
+                await websocket.close()
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        logger.info(f"Frame stream closed for {candidate_id}")
+
+
 @router.post("/upload_screen_recording", tags=["Frames"])
 async def upload_screen_recording(candidate_id: str = Form(...), recording: UploadFile = Form(...)):
     try:
@@ -349,13 +540,12 @@ async def log_tab_violation(candidate_id: str = Form(...), reason: str = Form(..
         if not candidate_id or len(candidate_id) > 100:
             raise HTTPException(status_code=400, detail="Invalid candidate ID")
 
-        db["cheating_logs"].insert_one({
-            "candidate_id": candidate_id,
-            "type": "tab_violation",
+        recorded = record_violation(candidate_id, candidate_id, "tab_violation", {
             "reason": reason,
-            "timestamp": timestamp,
-            "logged_at": datetime.utcnow()
+            "client_timestamp": timestamp
         })
+        if not recorded:
+            return JSONResponse(content={"error": "Violation log is busy, retry shortly"}, status_code=503)
         return JSONResponse(content={"message": "Violation logged"}, status_code=200)
 
     except PyMongoError as e:
@@ -363,4 +553,17 @@ async def log_tab_violation(candidate_id: str = Form(...), reason: str = Form(..
         raise HTTPException(status_code=500, detail="Database error") from e
     except Exception as e:
         logger.error(f"Tab violation logging failed: {str(e)}")
-        raise HTTPException(status_code=500, detail="Internal server error") from e
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Internal server error") from e
+
+@router.get("/violations/{candidate_id}", tags=["Frames"])
+async def get_candidate_violations(candidate_id: str, limit: int = 100, before: Optional[datetime] = None):
+    """Summary counters plus newest-first violation events (page with ``before``)."""
+    try:
+        events, summary = await asyncio.gather(
+            repositories.get_violation_history(candidate_id, limit=limit, before=before),
+            repositories.get_violation_summary(candidate_id)
+        )
+    except PyMongoError as e:
+        logger.error(f"Violation history read failed: {str(e)}")
+        raise HTTPException(status_code=503, detail="Database unavailable") from e
+    return {"candidate_id": candidate_id, "summary": summary, "events": events}
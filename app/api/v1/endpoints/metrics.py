@@ -0,0 +1,33 @@
+from fastapi import APIRouter
+
+from app.db.event_sink import event_sink
+from app.db.session import mongo
+from app.utils.candidate_sessions import candidate_sessions
+from app.utils.evaluator import reference_embeddings
+from app.utils.inference_pool import inference_pool
+from app.utils.log_sink import pose_log_sink, cheating_log_sink
+from app.utils.stt_handler import stt_queue, transcripts
+from app.utils.stt_stream import transcription_streams
+
+router = APIRouter(tags=["Metrics"])
+
+
+@router.get("/")
+def get_metrics():
+    """Runtime counters for the inference pipeline."""
+    metrics = {
+        "candidate_sessions": candidate_sessions.stats(),
+        "inference_pool": inference_pool.stats(),
+        "answer_embeddings": reference_embeddings.stats(),
+        "stt_queue": stt_queue.stats(),
+        "stt_transcripts": transcripts.stats(),
+        "stt_streams": {"open": len(transcription_streams)},
+        "mongo": mongo.stats(),
+        "event_sink": event_sink.stats(),
+        "log_sinks": {"pose_logs": pose_log_sink.stats(), "cheating_logs": cheating_log_sink.stats()}
+    }
+    if metrics["inference_pool"]["mode"] == "in_process":
+        # YOLO only runs in this process when there is no worker pool
+        from app.utils.yolo_handler import get_batch_stats
+        metrics["yolo_batching"] = get_batch_stats()
+    return metrics
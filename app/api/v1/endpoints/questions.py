@@ -1,32 +1,72 @@
 from fastapi import APIRouter, UploadFile, Form, HTTPException, File
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
-from app.utils.stt_handler import speech_to_text
+from app.utils.stt_handler import read_audio_upload, speech_to_text, stt_queue
+from app.utils.stt_jobs import SttQueueFull
+from app.utils.stt_stream import (
+    STT_STREAM_MAX_BYTES, transcription_streams, append_chunk, finish_stream, ChunkOutOfOrder, StreamClosed
+)
 from app.utils.evaluator import evaluate_answer
-from app.utils.logger import save_result
+from app.utils.question_bank import question_bank
+from app.utils.candidate_sessions import candidate_sessions, open_session, run_session
 from datetime import datetime
-from app.db.session import db
+from typing import Optional
+from app.db.session import require_async_db
+from app.db import repositories
+import asyncio
 import traceback
 
 
 router = APIRouter()
-candidate_sessions = {}
 
-def get_question_entry(session, question_id):
-    return next((q for q in session["questions"] if q["question_id"] == question_id), None)
+def _answer_session(candidate_id: str):
+    session = candidate_sessions.get(candidate_id, create=False)
+    return session if session is not None and session.answers_started() else None
+
+async def get_answer_session(candidate_id: str):
+    """The candidate's session if it has started answering (and has not been evicted)."""
+    return await run_session(_answer_session, candidate_id)
+
+def resolve_expected_answer(question_id: int, expected_answer: Optional[str]) -> str:
+    """The server-side question bank is authoritative; the form field is a fallback for unknown IDs."""
+    expected = question_bank.get_expected_answer(question_id) or expected_answer
+    if expected is None:
+        raise HTTPException(status_code=400, detail=f"Unknown question {question_id} and no expected_answer provided")
+    return expected
+
+@router.get("/bank")
+async def list_question_bank():
+    """Question prompts for the client; expected answers are never sent."""
+    return {"questions": question_bank.list_questions()}
 
 @router.post("/submit_answer")
 async def submit_answer(
     candidate_id: str = Form(...),
     question_id: int = Form(...),
-    expected_answer: str = Form(...),
-    audio_file: UploadFile = File(...)
+    expected_answer: Optional[str] = Form(None),
+    audio_file: Optional[UploadFile] = File(None),
+    stream_id: Optional[str] = Form(None)
 ):
-    if not audio_file:
+    if not audio_file and not stream_id:
         raise HTTPException(status_code=400, detail="No audio file provided")
 
+    expected_answer = resolve_expected_answer(question_id, expected_answer)
+    # Unknown candidates get their 404 before any transcription or grading is spent on them
+    session = await open_session(candidate_id)
+    require_async_db()  # fail fast before spending a transcription
+
     try:
-        # user_answer = await speech_to_text(audio_file)
-        user_answer = await speech_to_text(audio_file, candidate_id, question_id, expected_answer)
+        if stream_id:
+            # Answer was uploaded in chunks; only the tail is left to transcribe
+            stream = get_stream(stream_id, candidate_id, question_id)
+            user_answer = await finish_stream(stream)
+        else:
+            # user_answer = await speech_to_text(audio_file)
+            user_answer = await speech_to_text(audio_file, candidate_id, question_id, expected_answer)
+    except SttQueueFull as e:
+        return JSONResponse(status_code=503, content={"error": str(e)})
+    except HTTPException:
+        raise
     except Exception as e:
         return JSONResponse(status_code=400, content={"error": str(e)})
 
@@ -38,51 +78,40 @@ async def submit_answer(
             user_answer = ""
         warning_msg = "Transcription was very short or unclear"
 
-    is_correct = evaluate_answer(user_answer, expected_answer)
+    # Model inference; keep it off the event loop
+    is_correct = await run_in_threadpool(evaluate_answer, user_answer, expected_answer, question_id=question_id)
 
     # Update in-memory session
-    session = candidate_sessions.setdefault(candidate_id, {
-        "questions": [],
-        "score": 0,
-        "start_time": datetime.now()
-    })
-
-    existing = get_question_entry(session, question_id)
+    await run_session(session.start_answers, datetime.now())
 
-    question_entry = {
-        "question_id": question_id,
-        "user_answer": user_answer,
-        "expected_answer": expected_answer,
-        "is_correct": is_correct,
-        "score": 1 if is_correct else -1,
-        "marked_for_review": False,
-        "skipped": False,
-        "edited": True if existing and existing.get("user_answer") else False
-    }
+    def answer(existing):
+        question_entry = {
+            "question_id": question_id,
+            "user_answer": user_answer,
+            "expected_answer": expected_answer,
+            "is_correct": is_correct,
+            "score": 1 if is_correct else -1,
+            "marked_for_review": False,
+            "skipped": False,
+            "edited": True if existing and existing.get("user_answer") else False
+        }
+        if existing:
+            existing.update(question_entry)
+            question_entry = existing
+        return question_entry
 
-    if existing:
-        existing.update(question_entry)
-    else:
-        session["questions"].append(question_entry)
+    question_entry = await run_session(session.update_answer, question_id, answer)
 
     # Update MongoDB QA log (one entry per candidate)
-    db["qa_logs"].update_one(
-        {"candidate_id": candidate_id},
-        {"$pull": {"qa_log": {"question_id": question_id}}}
-    )
-    db["qa_logs"].update_one(
-        {"candidate_id": candidate_id},
-        {"$push": {"qa_log": question_entry}},
-        upsert=True
-    )
+    await repositories.replace_qa_entry(candidate_id, question_entry)
 
     # Update score
-    session["score"] += 1 if is_correct else -1
+    score = await run_session(session.add_score, 1 if is_correct else -1)
 
     response = {
         "user_answer": user_answer,
         "is_correct": is_correct,
-        "current_score": session["score"]
+        "current_score": score
     }
     if warning_msg:
         response["warning"] = warning_msg
@@ -96,42 +125,34 @@ async def mark_for_review(candidate_id: str = Form(...), question_id: int = Form
     Prefer in-memory session for speed, but gracefully fall back to MongoDB so
     review state works even after backend restarts (which clear in-memory sessions).
     """
-    session = candidate_sessions.get(candidate_id)
-    if session:
-        existing = get_question_entry(session, question_id)
+    def mark(existing):
         # Treat as eligible if the question exists and is not marked as skipped
         if existing and existing.get("skipped") is False:
-            # Update in-memory state
             existing["marked_for_review"] = True
+            return existing
+        return None
+
+    session = await get_answer_session(candidate_id)
+    if session:
+        # Update session state
+        if await run_session(session.update_answer, question_id, mark):
             # Persist mark state to MongoDB
-            db["qa_logs"].update_one(
-                {"candidate_id": candidate_id, "qa_log.question_id": question_id},
-                {"$set": {"qa_log.$.marked_for_review": True}},
-                upsert=True
-            )
+            await repositories.mark_qa_entry_for_review(candidate_id, question_id)
             return {"message": f"Q{question_id} marked for review."}
 
     # Fallback: Check MongoDB for an answered entry and mark it
     # Consider answered if an entry exists and it's not marked as skipped
-    record = db["qa_logs"].find_one({
-        "candidate_id": candidate_id,
-        "qa_log": {"$elemMatch": {"question_id": question_id, "skipped": False}}
-    })
+    record = await repositories.find_question_entry(candidate_id, question_id, skipped=False)
     if not record:
         return JSONResponse(status_code=400, content={"error": "Please answer before marking for review."})
 
     # Persist mark state to MongoDB via positional operator
-    db["qa_logs"].update_one(
-        {"candidate_id": candidate_id, "qa_log.question_id": question_id},
-        {"$set": {"qa_log.$.marked_for_review": True}},
-        upsert=True
-    )
+    await repositories.mark_qa_entry_for_review(candidate_id, question_id)
 
     # If session exists but lacked the question entry (e.g., restart), optionally seed minimal state
-    if session is not None:
-        existing = get_question_entry(session, question_id)
+    def restore(existing):
         if not existing:
-            session.setdefault("questions", []).append({
+            return {
                 "question_id": question_id,
                 "user_answer": "(restored from DB)",
                 "expected_answer": "",
@@ -140,9 +161,12 @@ async def mark_for_review(candidate_id: str = Form(...), question_id: int = Form
                 "marked_for_review": True,
                 "skipped": False,
                 "edited": False
-            })
-        else:
-            existing["marked_for_review"] = True
+            }
+        existing["marked_for_review"] = True
+        return existing
+
+    if session is not None:
+        await run_session(session.update_answer, question_id, restore)
 
     return {"message": f"Q{question_id} marked for review."}
 
@@ -150,10 +174,7 @@ async def mark_for_review(candidate_id: str = Form(...), question_id: int = Form
 async def skip_question(candidate_id: str = Form(...), question_id: int = Form(...)):
     try:
         # Check if already logged
-        existing = db["qa_logs"].find_one({
-            "candidate_id": candidate_id,
-            "qa_log.question_id": question_id
-        })
+        existing = await repositories.find_question_entry(candidate_id, question_id)
 
         if existing:
             return {"message": f"Question {question_id} already exists in logs"}
@@ -168,13 +189,11 @@ async def skip_question(candidate_id: str = Form(...), question_id: int = Form(.
             "skipped": True
         }
 
-        db["qa_logs"].update_one(
-            {"candidate_id": candidate_id},
-            {"$push": {"qa_log": log}},
-            upsert=True
-        )
+        await repositories.push_qa_entry(candidate_id, log)
 
         return {"message": f"Question {question_id} skipped"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error skipping question: {str(e)}")
 
@@ -183,7 +202,7 @@ async def get_result(candidate_id: str = Form(...), candidate_name: str = Form(.
     try:
         print(f"[DEBUG] Fetching result for Candidate ID: {candidate_id}")
 
-        record = db["qa_logs"].find_one({"candidate_id": candidate_id})
+        record = await repositories.get_qa_log(candidate_id)
         print(f"[DEBUG] Record found in qa_logs: {record is not None}")
 
         if not record or "qa_log" not in record:
@@ -204,7 +223,7 @@ async def get_result(candidate_id: str = Form(...), candidate_name: str = Form(.
         result = "Pass" if percentage >= 60 else "Fail"
 
         # ✅ Save to database using unified logic
-        save_result(
+        await repositories.save_result(
             candidate_id=candidate_id,
             candidate_name=candidate_name,
             score=score,
@@ -243,13 +262,13 @@ async def get_result(candidate_id: str = Form(...), candidate_name: str = Form(.
 @router.get("/get_review_questions")
 async def get_review_questions(candidate_id: str):
     # Prefer in-memory session if available
-    session = candidate_sessions.get(candidate_id)
+    session = await get_answer_session(candidate_id)
     if session:
-        review_questions = [q for q in session["questions"] if q.get("marked_for_review")]
+        review_questions = [q for q in await run_session(session.answers) if q.get("marked_for_review")]
         return {"review_questions": review_questions}
 
     # Fallback to MongoDB so review state survives restarts
-    record = db["qa_logs"].find_one({"candidate_id": candidate_id})
+    record = await repositories.get_qa_log(candidate_id)
     if not record or "qa_log" not in record:
         return {"review_questions": []}
     qa_log = record["qa_log"]
@@ -266,21 +285,137 @@ async def get_review_questions(candidate_id: str):
 async def stt_only(
     candidate_id: str = Form(...),
     question_id: int = Form(...),
-    expected_answer: str = Form(...),
+    expected_answer: Optional[str] = Form(None),
     audio_file: UploadFile = File(...)
 ):
     try:
+        expected_answer = resolve_expected_answer(question_id, expected_answer)
         # user_answer = await speech_to_text(audio_file)
         user_answer = await speech_to_text(audio_file, candidate_id, question_id, expected_answer)
         return {"user_answer": user_answer.strip()}
+    except SttQueueFull as e:
+        return JSONResponse(status_code=503, content={"error": str(e)})
+    except HTTPException:
+        raise
     except Exception as e:
         return {"error": str(e)}
 
 
+@router.post("/stt_jobs")
+async def submit_stt_job(
+    candidate_id: str = Form(...),
+    question_id: int = Form(...),
+    audio_file: UploadFile = File(...)
+):
+    """Queue a transcription and return immediately with a job ID to poll."""
+    content = await read_audio_upload(audio_file)
+    try:
+        job = stt_queue.submit(content, candidate_id, question_id)
+    except SttQueueFull as e:
+        return JSONResponse(status_code=503, content={"error": str(e)})
+    return JSONResponse(status_code=202, content=job.to_dict())
+
+
+@router.get("/stt_jobs/{job_id}")
+async def get_stt_job(job_id: str, wait: float = 0):
+    """
+    Job status and, once done, the transcript. With ``wait`` (seconds, max 30)
+    the request long-polls until the job finishes or the wait runs out.
+    """
+    job = stt_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+
+    timeout = min(max(wait, 0), 30)
+    if timeout and not job.future.done():
+        try:
+            # Shielded: a timed-out poll must not cancel the job itself
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(job.future)), timeout)
+        except asyncio.TimeoutError:
+            pass  # still running; reported as queued/running
+        except Exception:
+            pass  # failed; the error is reported by to_dict()
+    return job.to_dict()
+
+
+def get_stream(stream_id: str, candidate_id: Optional[str] = None, question_id: Optional[int] = None):
+    """The open stream; when given, candidate_id/question_id must be the ones it was opened for."""
+    stream = transcription_streams.get(stream_id)
+    if stream is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired stream")
+    if candidate_id is not None and stream.candidate_id != candidate_id:
+        raise HTTPException(status_code=403, detail="Stream belongs to another candidate")
+    if question_id is not None and stream.question_id != question_id:
+        raise HTTPException(status_code=409, detail=f"Stream was opened for question {stream.question_id}")
+    return stream
+
+
+@router.post("/stt_stream")
+async def open_stt_stream(candidate_id: str = Form(...), question_id: int = Form(...)):
+    """
+    Start a chunked answer upload. Send consecutive pieces of one recording
+    to /stt_stream/{stream_id}/chunk, then finish the stream or pass its
+    stream_id to /submit_answer instead of an audio file.
+    """
+    await open_session(candidate_id)  # chunks are transcribed as they arrive; registered candidates only
+    stream = transcription_streams.open(candidate_id, question_id)
+    return {"stream_id": stream.stream_id}
+
+
+@router.post("/stt_stream/{stream_id}/chunk")
+async def upload_stt_chunk(
+    stream_id: str,
+    audio_chunk: UploadFile = File(...),
+    seq: Optional[int] = Form(None),
+    candidate_id: Optional[str] = Form(None)
+):
+    """
+    Append a chunk; returns the transcript of every segment completed so far.
+    ``seq`` numbers the chunks from 0; a chunk that is not the next one is
+    rejected with 409 and the expected number.
+    """
+    stream = get_stream(stream_id, candidate_id)
+    content = await read_audio_upload(audio_chunk, STT_STREAM_MAX_BYTES)
+    try:
+        partial = await append_chunk(stream, content, seq)
+    except SttQueueFull as e:
+        return JSONResponse(status_code=503, content={"error": str(e)})
+    except ChunkOutOfOrder as e:
+        return JSONResponse(status_code=409, content={"error": str(e), "expected_seq": stream.next_seq})
+    except StreamClosed as e:
+        return JSONResponse(status_code=409, content={"error": str(e)})
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"error": f"Speech-to-text failed: {str(e)}"})
+    return {
+        "stream_id": stream_id,
+        "seq": stream.next_seq - 1,
+        "partial": partial,
+        "committed_seconds": stream.committed_seconds
+    }
+
+
+@router.post("/stt_stream/{stream_id}/finish")
+async def finish_stt_stream(
+    stream_id: str,
+    audio_chunk: Optional[UploadFile] = File(None),
+    candidate_id: Optional[str] = Form(None)
+):
+    """Transcribe the remaining tail (plus an optional last chunk) and close the stream."""
+    stream = get_stream(stream_id, candidate_id)
+    content = await read_audio_upload(audio_chunk, STT_STREAM_MAX_BYTES) if audio_chunk else b""
+    try:
+        user_answer = await finish_stream(stream, content)
+    except SttQueueFull as e:
+        return JSONResponse(status_code=503, content={"error": str(e)})
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"error": f"Speech-to-text failed: {str(e)}"})
+    return {"user_answer": user_answer}
+
+
 @router.post("/check_status")
 async def check_status(candidate_id: str = Form(...)):
     try:
-        record = db["result"].find_one({"candidate_id": candidate_id})
+        record = await repositories.get_result(candidate_id)
         if record:
             if record.get("failed_due_to_cheating"):
                 return {"test_completed": True, "banned": True,
@@ -288,6 +423,8 @@ async def check_status(candidate_id: str = Form(...)):
             if record.get("test_completed"):
                 return {"test_completed": True, "message": "Test already completed"}
         return {"test_completed": False}
+    except HTTPException:
+        raise
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -15,10 +15,8 @@ def register_candidate(data: RegisterRequest):
     if not name:
         raise HTTPException(status_code=400, detail="Name is required")
 
-    # Acquire DB lazily (will reconnect if Mongo started after app)
-    db = db_session.get_db()
-    if db is None:
-        raise HTTPException(status_code=503, detail="Database unavailable. Please ensure MongoDB is running.")
+    # Fails fast with 503 while the health monitor sees Mongo as down
+    db = db_session.require_db()
 
     candidate_id = f"CAND-{str(uuid4())[:8]}"
     try:
@@ -5,11 +5,20 @@ import io
 import cv2
 import time
 
-from app.utils.head_pose_estimator import HeadPoseEstimator
+from app.utils.head_pose_estimator import HeadPoseEstimator, rotation_to_euler
 from app.utils.logger import log_cheating_to_mongo  # ✅ updated import
+from app.utils.model_registry import models
 
 router = APIRouter(tags=["Status"])
-pose_estimator = HeadPoseEstimator()
+
+
+def _warm_up_head_pose(estimator):
+    estimator.estimate_pose(np.zeros((480, 640, 3), dtype=np.uint8))
+
+
+# Shared FaceMesh graph for this endpoint; frames.py tracks per candidate instead
+models.register("head_pose", HeadPoseEstimator, _warm_up_head_pose)
+
 
 @router.get("/")
 def root():
@@ -37,6 +46,7 @@ async def detect_head_pose(
             img = cv2.resize(img, new_size, interpolation=cv2.INTER_AREA)
 
         # Head pose estimation
+        pose_estimator = models.get("head_pose")
         rvec, tvec, _ = pose_estimator.estimate_pose(img)
         if rvec is None:
             # Quick retry with mild enhancement (helps in low-light/blur)
@@ -63,24 +73,8 @@ async def detect_head_pose(
                 "reason": reason
             }
 
-        # Convert rvec to yaw/pitch/roll
-        rotation_matrix, _ = cv2.Rodrigues(rvec)
-        sy = np.sqrt(rotation_matrix[0, 0]**2 + rotation_matrix[1, 0]**2)
-        singular = sy < 1e-6
-
-        if not singular:
-            pitch = np.arctan2(rotation_matrix[2, 1], rotation_matrix[2, 2])
-            yaw = np.arctan2(-rotation_matrix[2, 0], sy)
-            roll = np.arctan2(rotation_matrix[1, 0], rotation_matrix[0, 0])
-        else:
-            pitch = np.arctan2(-rotation_matrix[1, 2], rotation_matrix[1, 1])
-            yaw = np.arctan2(-rotation_matrix[2, 0], sy)
-            roll = 0
-
-        # Convert to degrees
-        yaw = np.degrees(yaw)
-        pitch = np.degrees(pitch)
-        roll = np.degrees(roll)
+        # Convert rvec to yaw/pitch/roll (degrees)
+        yaw, pitch, roll = rotation_to_euler(rvec)
 
         # Detect cheating
         cheating = False
@@ -0,0 +1,169 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from app.db import session as db_session
+
+logger = logging.getLogger(__name__)
+
+# Write-behind buffer for proctoring events (override via environment)
+EVENT_SINK_BATCH = int(os.getenv("EVENT_SINK_BATCH", "500"))  # flush once this many writes are queued
+EVENT_SINK_FLUSH_MS = int(os.getenv("EVENT_SINK_FLUSH_MS", "500"))  # ... or this long after the first one
+EVENT_SINK_MAX_PENDING = int(os.getenv("EVENT_SINK_MAX_PENDING", "20000"))
+
+
+class EventSink:
+    """
+    Queues pymongo write operations (UpdateOne, InsertOne, ...) in memory and
+    sends them per collection with bulk_write(ordered=False) from a background
+    thread, so Mongo round-trips stay off the frame/request path.
+
+    Enqueueing never does I/O, so it is safe from async handlers. Memory is
+    bounded by max_pending: when the buffer is full new writes are rejected
+    (enqueue returns False and they count as dropped) rather than flushed on
+    the caller's thread. Writes that must land before the response goes out
+    (bans) use write_now().
+    """
+
+    def __init__(self, batch_size: int = EVENT_SINK_BATCH, flush_ms: int = EVENT_SINK_FLUSH_MS,
+                 max_pending: int = EVENT_SINK_MAX_PENDING):
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+        self.max_pending = max_pending
+        self._pending = deque()  # (collection, operation)
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()  # one bulk_write round at a time
+        self._thread = None
+        self._stopping = False
+        self.enqueued = 0
+        self.written = 0
+        self.failed = 0
+        self.dropped = 0
+        self.batches = 0
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._loop, name="event-sink", daemon=True)
+            self._thread.start()
+
+    def shutdown(self):
+        """Stop the flusher and write out everything still buffered."""
+        with self._cond:
+            thread, self._thread = self._thread, None
+            self._stopping = True
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join()
+        self.flush()
+
+    def enqueue(self, collection: str, operation) -> bool:
+        return self.enqueue_many([(collection, operation)])
+
+    def enqueue_many(self, writes: list) -> bool:
+        """
+        Buffer (collection, operation) pairs, all or none. Returns False when
+        the buffer has no room for them, so callers can shed load (e.g. 503).
+        """
+        with self._cond:
+            if len(self._pending) + len(writes) > self.max_pending:
+                self.dropped += len(writes)
+                accepted = False
+            else:
+                was_empty = not self._pending
+                self._pending.extend(writes)
+                self.enqueued += len(writes)
+                if was_empty or len(self._pending) >= self.batch_size:
+                    # First write starts the flush timer; a full batch flushes right away
+                    self._cond.notify()
+                accepted = True
+            start = self._thread is None and not self._stopping
+        if not accepted:
+            logger.warning(f"Event sink full ({self.max_pending} writes pending); dropped {len(writes)}")
+        if start:
+            self.start()  # normally started by the app's startup hook
+        return accepted
+
+    def write_now(self, collection: str, operation):
+        """Synchronous bypass; raises PyMongoError like a direct call would."""
+        db = db_session.get_db()
+        if db is None:
+            raise PyMongoError("MongoDB is not connected")
+        return db[collection].bulk_write([operation], ordered=False)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._cond:
+                batch = list(self._pending)
+                self._pending.clear()
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch):
+        db = db_session.get_db()
+        if db is None:
+            self._requeue(batch, "MongoDB is not connected")
+            return
+
+        by_collection = {}
+        for collection, operation in batch:
+            by_collection.setdefault(collection, []).append(operation)
+
+        for collection, operations in by_collection.items():
+            try:
+                db[collection].bulk_write(operations, ordered=False)
+                self.written += len(operations)
+            except BulkWriteError as e:
+                # Unordered: everything but the reported errors was applied
+                errors = e.details.get("writeErrors", [])
+                self.written += len(operations) - len(errors)
+                self.failed += len(errors)
+                logger.error(f"{len(errors)} buffered writes to {collection} failed: {errors[:1]}")
+            except PyMongoError as e:
+                self._requeue([(collection, op) for op in operations], str(e))
+            self.batches += 1
+
+    def _requeue(self, batch, reason: str):
+        """Keep writes for the next round after a transient failure, within max_pending."""
+        with self._cond:
+            room = max(self.max_pending - len(self._pending), 0)
+            kept = batch[:room]
+            self._pending.extendleft(reversed(kept))
+            self.dropped += len(batch) - len(kept)
+        logger.warning(f"Deferred {len(kept)} buffered writes ({len(batch) - len(kept)} dropped): {reason}")
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                if not self._pending and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                if len(self._pending) < self.batch_size:
+                    # Give the batch time to fill up, unless it fills first
+                    self._cond.wait(self.flush_interval)
+                if self._stopping:
+                    return
+            self.flush()
+            if not db_session.mongo.healthy:
+                time.sleep(self.flush_interval)  # don't spin while Mongo is away
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "max_pending": self.max_pending,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "batches": self.batches
+        }
+
+
+event_sink = EventSink()
@@ -0,0 +1,128 @@
+"""
+Async data access for the async endpoints, on the motor driver.
+
+Every function awaits its I/O instead of blocking the event loop, and raises
+HTTP 503 (via require_async_db) while the health monitor sees MongoDB as
+down. Blocking code paths (threadpool handlers, the event sink) keep using
+the pymongo handle from app.db.session.
+"""
+import logging
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import DESCENDING
+
+from app.db.session import require_async_db
+from app.db.violation_store import EVENTS_COLLECTION, HISTORY_MAX, SUMMARY_COLLECTION
+
+logger = logging.getLogger(__name__)
+
+
+# --- candidates ---
+
+async def insert_candidate(candidate: dict):
+    return await require_async_db()["candidates"].insert_one(candidate)
+
+
+async def candidate_exists(candidate_id: str) -> bool:
+    query = {"candidate_id": candidate_id}
+    if ObjectId.is_valid(candidate_id):
+        # /register-candidate/ used to return the document's _id without storing a candidate_id
+        query = {"$or": [query, {"_id": ObjectId(candidate_id)}]}
+    doc = await require_async_db()["candidates"].find_one(query, {"_id": 1})
+    return doc is not None
+
+
+# --- qa_logs ---
+
+async def get_qa_log(candidate_id: str):
+    return await require_async_db()["qa_logs"].find_one({"candidate_id": candidate_id})
+
+
+async def find_question_entry(candidate_id: str, question_id: int, **match):
+    """The candidate's qa_logs document if it has an entry for question_id (matching ``match``)."""
+    if match:
+        query = {"candidate_id": candidate_id, "qa_log": {"$elemMatch": {"question_id": question_id, **match}}}
+    else:
+        query = {"candidate_id": candidate_id, "qa_log.question_id": question_id}
+    return await require_async_db()["qa_logs"].find_one(query)
+
+
+async def push_qa_entry(candidate_id: str, entry: dict):
+    await require_async_db()["qa_logs"].update_one(
+        {"candidate_id": candidate_id},
+        {"$push": {"qa_log": entry}},
+        upsert=True
+    )
+
+
+async def replace_qa_entry(candidate_id: str, entry: dict):
+    """
+    Drop any earlier entry for the same question and append this one, in a
+    single pipeline update (MongoDB 4.2+) so no reader ever sees the
+    question missing and a failure cannot leave it half-replaced.
+    """
+    await require_async_db()["qa_logs"].update_one(
+        {"candidate_id": candidate_id},
+        [{"$set": {"qa_log": {"$concatArrays": [
+            {"$filter": {
+                "input": {"$ifNull": ["$qa_log", []]},
+                "cond": {"$ne": ["$$this.question_id", entry["question_id"]]}
+            }},
+            [{"$literal": entry}]
+        ]}}}],
+        upsert=True
+    )
+
+
+async def mark_qa_entry_for_review(candidate_id: str, question_id: int):
+    await require_async_db()["qa_logs"].update_one(
+        {"candidate_id": candidate_id, "qa_log.question_id": question_id},
+        {"$set": {"qa_log.$.marked_for_review": True}},
+        upsert=True
+    )
+
+
+# --- results ---
+
+async def get_result(candidate_id: str):
+    return await require_async_db()["result"].find_one({"candidate_id": candidate_id})
+
+
+async def save_result(candidate_id, candidate_name, score, total_questions, result, percentage):
+    result_doc = {
+        "candidate_id": candidate_id,
+        "candidate_name": candidate_name,
+        "score": score,
+        "total_questions": total_questions,
+        "percentage": percentage,
+        "result": result,
+        "test_completed": True,
+        "completed_at": datetime.utcnow()
+    }
+    await require_async_db()["result"].update_one(
+        {"candidate_id": candidate_id},
+        {"$set": result_doc},
+        upsert=True
+    )
+    logger.info(f"Final result saved for {candidate_name}")
+
+
+# --- cheating logs / violation events ---
+
+async def get_violation_history(candidate_id: str, limit: int = 100, before: datetime = None) -> list:
+    """Newest-first events for one candidate, served by the candidate_timeline index."""
+    query = {"candidate_id": candidate_id}
+    if before is not None:
+        query["timestamp"] = {"$lt": before}
+    cursor = (
+        require_async_db()[EVENTS_COLLECTION]
+        .find(query, {"_id": 0})
+        .sort("timestamp", DESCENDING)
+        .limit(min(max(limit, 1), HISTORY_MAX))
+    )
+    return await cursor.to_list(length=None)
+
+
+async def get_violation_summary(candidate_id: str):
+    return await require_async_db()[SUMMARY_COLLECTION].find_one({"candidate_id": candidate_id}, {"_id": 0})
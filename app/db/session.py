@@ -1,56 +1,161 @@
+from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo import MongoClient
 import os
+import threading
+import time
 from dotenv import load_dotenv
 import logging
-from pymongo import errors
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 
-# MongoDB connection string
+# MongoDB connection settings (override via environment)
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "proctoring_db")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "2000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "2000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "10000"))
+MONGO_HEALTH_INTERVAL = float(os.getenv("MONGO_HEALTH_INTERVAL", "5"))  # seconds between pings
 
-# Connect to MongoDB with short timeouts and verify connectivity
-client = MongoClient(MONGO_URL, serverSelectionTimeoutMS=5000, connectTimeoutMS=5000)
 
-try:
-    # Force a ping to check that MongoDB is reachable
-    client.admin.command("ping")
-    db = client["proctoring_db"]
-except errors.ServerSelectionTimeoutError as e:
-    logging.error(f"MongoDB connection failed: {e}")
-    db = None
+class MongoManager:
+    """
+    Owns the single MongoClient (and its connection pool) for the process.
 
-# Collections (you can access these dynamically in your routes)
-mongo_collection = db["cheating_logs"] if db is not None else None
+    pymongo reconnects on its own, so the client is never rebuilt; a
+    background thread pings every MONGO_HEALTH_INTERVAL seconds and flips
+    ``healthy``. Requests read that flag instead of pinging, so while Mongo
+    is down they fail immediately with a 503 rather than each waiting out
+    the server selection timeout.
+    """
 
+    def __init__(self):
+        self.client = MongoClient(
+            MONGO_URL,
+            connect=False,  # no I/O at import; the first ping opens the pool
+            **self.client_options()
+        )
+        self.db = self.client[MONGO_DB_NAME]
+        self.async_client = None  # motor client, created on first use inside the event loop
+        self.healthy = False
+        self.last_error = None
+        self.last_check = None
+        self._checked = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
 
-def get_db():
-    """Return a live MongoDB database handle, reconnecting if needed.
+    @staticmethod
+    def client_options() -> dict:
+        return {
+            "maxPoolSize": MONGO_MAX_POOL_SIZE,
+            "minPoolSize": MONGO_MIN_POOL_SIZE,
+            "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+            "socketTimeoutMS": MONGO_SOCKET_TIMEOUT_MS
+        }
 
-    This allows the API to recover if MongoDB starts after the app.
-    Returns None if still unavailable.
-    """
-    global client, db, MONGO_URL, mongo_collection
-    # If we think we're connected, verify with a ping
-    if db is not None:
+    def check(self) -> bool:
+        """Ping once and record the result."""
         try:
-            client.admin.command("ping")
-            return db
-        except Exception:
-            logging.warning("MongoDB ping failed; attempting to reconnect...")
-
-    try:
-        # Refresh URI from environment in case it changed
-        MONGO_URL = os.getenv("MONGO_URL", MONGO_URL)
-        client = MongoClient(MONGO_URL, serverSelectionTimeoutMS=5000, connectTimeoutMS=5000)
-        client.admin.command("ping")
-        db = client["proctoring_db"]
-        mongo_collection = db["cheating_logs"]
-        logging.info("MongoDB reconnected successfully.")
+            self.client.admin.command("ping")
+            if not self.healthy:
+                logger.info("MongoDB is reachable")
+            self.healthy = True
+            self.last_error = None
+        except Exception as e:
+            if self.healthy or not self._checked.is_set():
+                logger.error(f"MongoDB unavailable: {e}")
+            self.healthy = False
+            self.last_error = str(e)
+        self.last_check = time.time()
+        self._checked.set()
+        return self.healthy
+
+    def start(self):
+        """Initial check plus the background monitor; called from the app startup hook."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._monitor, name="mongo-health", daemon=True)
+        self.check()
+        self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        self._stop.set()
+        if thread is not None:
+            thread.join()
+        self.client.close()
+        if self.async_client is not None:
+            self.async_client.close()
+            self.async_client = None
+
+    def _monitor(self):
+        while not self._stop.wait(MONGO_HEALTH_INTERVAL):
+            self.check()
+
+    def get_db(self):
+        """The live database handle, or None while MongoDB is down."""
+        if not self._checked.is_set():
+            # Used outside the app (scripts) before start(): check once
+            self.check()
+        return self.db if self.healthy else None
+
+    def require_db(self):
+        db = self.get_db()
+        if db is None:
+            raise HTTPException(status_code=503, detail="Database unavailable. Please ensure MongoDB is running.")
         return db
-    except Exception as e:
-        logging.error(f"MongoDB reconnection failed: {e}")
-        db = None
-        mongo_collection = None
-        return None
+
+    def get_async_db(self):
+        """
+        Motor handle for async endpoints (same health flag as the sync
+        client), or None while MongoDB is down. Motor binds to the running
+        event loop, so the client is created on the first call from it.
+        """
+        if self.get_db() is None:
+            return None
+        if self.async_client is None:
+            self.async_client = AsyncIOMotorClient(MONGO_URL, **self.client_options())
+        return self.async_client[MONGO_DB_NAME]
+
+    def require_async_db(self):
+        db = self.get_async_db()
+        if db is None:
+            raise HTTPException(status_code=503, detail="Database unavailable. Please ensure MongoDB is running.")
+        return db
+
+    def stats(self) -> dict:
+        return {
+            "healthy": self.healthy,
+            "last_error": self.last_error,
+            "last_check": self.last_check,
+            "max_pool_size": MONGO_MAX_POOL_SIZE,
+            "health_interval_s": MONGO_HEALTH_INTERVAL
+        }
+
+
+mongo = MongoManager()
+
+
+def get_db():
+    """Return the cached MongoDB database handle, or None while it is unreachable."""
+    return mongo.get_db()
+
+
+def require_db():
+    """Blocking database handle for sync code paths; raises HTTP 503 while MongoDB is down."""
+    return mongo.require_db()
+
+
+def require_async_db():
+    """Motor database handle for async handlers; raises HTTP 503 while MongoDB is down."""
+    return mongo.require_async_db()
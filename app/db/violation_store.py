@@ -0,0 +1,225 @@
+import logging
+import re
+from datetime import datetime
+
+from pymongo import ASCENDING, DESCENDING, InsertOne, UpdateOne
+from pymongo.errors import PyMongoError
+
+from app.db import session as db_session
+from app.db.event_sink import event_sink
+
+logger = logging.getLogger(__name__)
+
+EVENTS_COLLECTION = "violation_events"  # append-only, one document per violation
+SUMMARY_COLLECTION = "cheating_logs"  # one small document per candidate
+HISTORY_MAX = 500
+LEGACY_TAB_TYPE = "tab_violation"  # per-event documents the old tab endpoint wrote into cheating_logs
+
+# "Head turned too far (Yaw: 47.3°)" -> "Head turned too far"
+_DETAIL_SUFFIX = re.compile(r"\s*\(.*\)\s*$")
+
+
+def violation_category(cheating_type: str) -> str:
+    """Stable counter name; per-event measurements stay in the event itself."""
+    return _DETAIL_SUFFIX.sub("", cheating_type or "").strip() or "unknown"
+
+
+def warning_key(category: str) -> str:
+    # Dots/dollars would turn the counter into a nested or operator path
+    return category.replace(".", "\uff0e").replace("$", "\uff04")
+
+
+def _summary_types(doc: dict) -> list:
+    """Categories of a summary document, including legacy ones that only have the comma-joined string."""
+    if doc.get("cheating_types"):
+        return list(doc["cheating_types"])
+    return [violation_category(t) for t in (doc.get("cheating_type") or "").split(",") if t.strip()]
+
+
+def _merge_summaries(docs: list) -> dict:
+    """One summary from several documents of the same candidate, ordered oldest first."""
+    merged = {k: v for k, v in docs[-1].items() if k != "_id"}
+    warnings, types, total = {}, [], 0
+    for doc in docs:
+        doc_warnings = (doc.get("details") or {}).get("warnings") or {}
+        for key, count in doc_warnings.items():
+            warnings[key] = warnings.get(key, 0) + count
+        total += doc.get("total_violations", sum(doc_warnings.values()))
+        types += [t for t in _summary_types(doc) if t not in types]
+    firsts = [d.get("first_violation_at") or d.get("timestamp") for d in docs]
+    merged.setdefault("details", {})["warnings"] = warnings
+    merged["total_violations"] = total
+    merged["cheating_types"] = types
+    merged["cheating_type"] = ", ".join(types)
+    merged["first_violation_at"] = min((f for f in firsts if f is not None), default=None)
+    return merged
+
+
+# Second pipeline stage of every summary update: cheating_type is the comma-joined cheating_types
+_JOIN_TYPES = {"$set": {"cheating_type": {"$reduce": {
+    "input": "$cheating_types",
+    "initialValue": "",
+    "in": {"$cond": [
+        {"$eq": ["$$value", ""]}, "$$this", {"$concat": ["$$value", ", ", "$$this"]}
+    ]}
+}}}}
+
+
+def _add_type(category: str) -> dict:
+    types = {"$ifNull": ["$cheating_types", []]}
+    value = {"$literal": category}
+    return {"$cond": [{"$in": [value, types]}, types, {"$concatArrays": [types, [value]]}]}
+
+
+def _legacy_logged_at(doc: dict) -> datetime:
+    # logged_at is the server's clock; "timestamp" on these documents is a client string
+    logged_at = doc.get("logged_at")
+    if isinstance(logged_at, datetime):
+        return logged_at
+    return doc["_id"].generation_time.replace(tzinfo=None)
+
+
+def _migrate_tab_violations(collection, events):
+    """
+    Move the per-event tab documents out of cheating_logs: each becomes a
+    violation_events document (keeping its _id, so a re-run cannot insert it
+    twice) and the candidate's summary is credited with them, then they are
+    removed. Summaries are never built from them.
+    """
+    groups = collection.aggregate([
+        {"$match": {"type": LEGACY_TAB_TYPE}},
+        {"$group": {"_id": "$candidate_id", "ids": {"$push": "$_id"}}}
+    ], allowDiskUse=True)
+    for group in groups:
+        candidate_id = group["_id"]
+        docs = list(collection.find({"_id": {"$in": group["ids"]}}))
+        times = [_legacy_logged_at(d) for d in docs]
+        events.bulk_write([
+            UpdateOne({"_id": doc["_id"]}, {"$setOnInsert": {
+                "candidate_id": candidate_id,
+                "candidate_name": candidate_id,
+                "type": LEGACY_TAB_TYPE,
+                "category": LEGACY_TAB_TYPE,
+                "timestamp": logged_at,
+                "details": {"reason": doc.get("reason"), "client_timestamp": doc.get("timestamp")}
+            }}, upsert=True)
+            for doc, logged_at in zip(docs, times)
+        ], ordered=False)
+
+        warning_path = f"details.warnings.{warning_key(LEGACY_TAB_TYPE)}"
+        collection.update_one(
+            {"candidate_id": candidate_id, "type": {"$ne": LEGACY_TAB_TYPE}},
+            [
+                {"$set": {
+                    "candidate_name": {"$ifNull": ["$candidate_name", {"$literal": candidate_id}]},
+                    "last_cheating_type": {"$ifNull": ["$last_cheating_type", LEGACY_TAB_TYPE]},
+                    "timestamp": {"$max": ["$timestamp", max(times)]},
+                    warning_path: {"$add": [{"$ifNull": [f"${warning_path}", 0]}, len(docs)]},
+                    "total_violations": {"$add": [{"$ifNull": ["$total_violations", 0]}, len(docs)]},
+                    "first_violation_at": {"$min": ["$first_violation_at", min(times)]},
+                    "cheating_types": _add_type(LEGACY_TAB_TYPE)
+                }},
+                _JOIN_TYPES
+            ],
+            upsert=True
+        )
+        collection.delete_many({"_id": {"$in": group["ids"]}})
+        logger.info(f"Moved {len(docs)} legacy tab violations of candidate {candidate_id} to {EVENTS_COLLECTION}")
+
+
+def migrate_summaries(collection, events):
+    """
+    Bring cheating_logs up to the current schema before the unique index is
+    built: backfill cheating_types and total_violations on legacy summaries,
+    move the old per-event tab documents into events, then merge duplicate
+    summaries of one candidate (left by concurrent upserts before the index
+    was unique).
+    """
+    # Backfill first: folding the tab events in sets cheating_types
+    for doc in collection.find({"cheating_types": {"$exists": False}, "type": {"$ne": LEGACY_TAB_TYPE}}):
+        merged = _merge_summaries([doc])
+        collection.update_one({"_id": doc["_id"]}, {"$set": {
+            "cheating_types": merged["cheating_types"],
+            "cheating_type": merged["cheating_type"],
+            "total_violations": merged["total_violations"]
+        }})
+
+    _migrate_tab_violations(collection, events)
+
+    duplicates = collection.aggregate([
+        {"$group": {"_id": "$candidate_id", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}}
+    ], allowDiskUse=True)
+    for group in duplicates:
+        docs = list(collection.find({"_id": {"$in": group["ids"]}}).sort("timestamp", ASCENDING))
+        keep = docs[-1]["_id"]
+        collection.replace_one({"_id": keep}, _merge_summaries(docs))
+        collection.delete_many({"_id": {"$in": [d["_id"] for d in docs if d["_id"] != keep]}})
+        logger.info(f"Merged {len(docs)} violation summaries of candidate {group['_id']}")
+
+
+def ensure_indexes():
+    """Create the indexes history and summary reads rely on; safe to call repeatedly."""
+    db = db_session.get_db()
+    if db is None:
+        logger.warning("MongoDB unavailable; violation store indexes not ensured")
+        return
+    try:
+        db[EVENTS_COLLECTION].create_index(
+            [("candidate_id", ASCENDING), ("timestamp", DESCENDING)], name="candidate_timeline"
+        )
+        summaries = db[SUMMARY_COLLECTION]
+        if not summaries.index_information().get("candidate", {}).get("unique"):
+            migrate_summaries(summaries, db[EVENTS_COLLECTION])
+            if "candidate" in summaries.index_information():
+                summaries.drop_index("candidate")  # the earlier non-unique version
+        # Unique, so concurrent first upserts of a candidate cannot create two summaries
+        summaries.create_index("candidate_id", name="candidate", unique=True)
+    except PyMongoError as e:
+        logger.error(f"Could not create violation store indexes: {str(e)}")
+
+
+def record_violation(candidate_id: str, candidate_name: str, cheating_type: str, details: dict = None,
+                     timestamp: datetime = None) -> bool:
+    """
+    Append the event and bump the candidate's summary counters. Both writes
+    are blind (no read first) and go through the write-behind sink, so a
+    violation costs no round-trip on the request path. Returns False when
+    the sink is full and the violation was not recorded.
+    """
+    details = details or {}
+    timestamp = timestamp or datetime.utcnow()
+    category = violation_category(cheating_type)
+
+    event = InsertOne({
+        "candidate_id": candidate_id,
+        "candidate_name": candidate_name,
+        "type": cheating_type,
+        "category": category,
+        "timestamp": timestamp,
+        "details": details
+    })
+    # Pipeline update (MongoDB 4.2+) so cheating_type can stay the comma-joined
+    # list of categories readers expect; user-supplied strings go in $literal
+    warning_path = f"details.warnings.{warning_key(category)}"
+    summary = UpdateOne(
+        {"candidate_id": candidate_id},
+        [
+            {"$set": {
+                "candidate_name": {"$literal": candidate_name},
+                "last_cheating_type": {"$literal": cheating_type},
+                "timestamp": timestamp,
+                "details.yaw": {"$literal": details.get("yaw")},
+                "details.pitch": {"$literal": details.get("pitch")},
+                "details.roll": {"$literal": details.get("roll")},
+                warning_path: {"$add": [{"$ifNull": [f"${warning_path}", 0]}, 1]},
+                "total_violations": {"$add": [{"$ifNull": ["$total_violations", 0]}, 1]},
+                "first_violation_at": {"$ifNull": ["$first_violation_at", timestamp]},
+                "cheating_types": _add_type(category)
+            }},
+            _JOIN_TYPES
+        ],
+        upsert=True
+    )
+    return event_sink.enqueue_many([(EVENTS_COLLECTION, event), (SUMMARY_COLLECTION, summary)])
+
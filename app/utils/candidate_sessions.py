@@ -0,0 +1,284 @@
+import os
+import sys
+import time
+import threading
+import logging
+from collections import OrderedDict
+from datetime import timedelta
+
+import numpy as np
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from app.db import repositories
+
+logger = logging.getLogger(__name__)
+
+# Registry limits (override via environment)
+CANDIDATE_SESSION_MAX = int(os.getenv("CANDIDATE_SESSION_MAX", "50000"))
+CANDIDATE_SESSION_IDLE_TTL = float(os.getenv("CANDIDATE_SESSION_IDLE_TTL", "3600"))  # seconds
+# memory: per-process (single uvicorn worker); redis: shared by every worker and node
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
+
+POSE_WINDOW = 10  # frames averaged for yaw/pitch smoothing
+POSE_SUSTAIN_SECONDS = 3  # a pose violation must last this long to count
+WARNING_PAUSE_SECONDS = 30
+MAX_WARNINGS = 2  # the next violation disqualifies
+
+
+class SessionRegistryFull(RuntimeError):
+    """Raised when every session slot is held by a candidate that is still active."""
+
+
+class CandidateSession:
+    """
+    Everything the API tracks per candidate: proctoring counters, the pose
+    smoothing window, the sustained-pose-violation timer and the in-memory
+    answer sheet. Uses __slots__ and a fixed (POSE_WINDOW, 2) float32 ring
+    buffer so a session stays a few hundred bytes.
+
+    The API only goes through the methods below, never the fields;
+    RedisCandidateSession (app/utils/redis_sessions.py) implements the same
+    methods on a shared store for multi-worker deployments.
+    """
+
+    __slots__ = (
+        "candidate_id", "face_not_detected", "violation_count", "pause_until",
+        "pose_window", "pose_count", "pose_pos",
+        "violation_start", "violation_reason",
+        "questions", "score", "start_time",
+        "lock", "last_used"
+    )
+
+    def __init__(self, candidate_id: str):
+        self.candidate_id = candidate_id
+        self.face_not_detected = 0
+        self.violation_count = 0
+        self.pause_until = None
+        self.pose_window = np.zeros((POSE_WINDOW, 2), dtype=np.float32)  # (yaw, pitch) rows
+        self.pose_count = 0
+        self.pose_pos = 0
+        self.violation_start = None
+        self.violation_reason = None
+        self.questions = []  # answer sheet entries, see questions.py
+        self.score = 0
+        self.start_time = None
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+    def touch(self):
+        self.last_used = time.monotonic()
+
+    # --- proctoring ---
+
+    def pause_remaining(self, now) -> int:
+        """Seconds left on a warning pause, or None when not paused."""
+        if self.pause_until is not None and now < self.pause_until:
+            return int((self.pause_until - now).total_seconds())
+        return None
+
+    def add_pose(self, yaw: float, pitch: float):
+        """Push one frame's pose and return the smoothed (yaw, pitch) over the window."""
+        with self.lock:
+            self.pose_window[self.pose_pos] = (yaw, pitch)
+            self.pose_pos = (self.pose_pos + 1) % POSE_WINDOW
+            self.pose_count = min(self.pose_count + 1, POSE_WINDOW)
+            mean = self.pose_window[:self.pose_count].mean(axis=0)
+        return float(mean[0]), float(mean[1])
+
+    def sustained_pose_violation(self, reason, now):
+        """
+        Track how long the current pose violation has lasted; returns the
+        reason it started with once it has lasted POSE_SUSTAIN_SECONDS.
+        """
+        with self.lock:
+            if reason is None:
+                self.violation_start = self.violation_reason = None
+                return None
+            if self.violation_start is None:
+                self.violation_start, self.violation_reason = now, reason
+                return None
+            if (now - self.violation_start).total_seconds() >= POSE_SUSTAIN_SECONDS:
+                return self.violation_reason
+            return None
+
+    def face_failures(self) -> int:
+        return self.face_not_detected
+
+    def record_face_failure(self) -> int:
+        with self.lock:
+            self.face_not_detected += 1
+            return self.face_not_detected
+
+    def record_violation(self, now) -> int:
+        """Count a violation; warnings (up to MAX_WARNINGS) also pause the test."""
+        with self.lock:
+            self.violation_count += 1
+            if self.violation_count <= MAX_WARNINGS:
+                self.pause_until = now + timedelta(seconds=WARNING_PAUSE_SECONDS)
+            return self.violation_count
+
+    # --- answers ---
+
+    def start_answers(self, now):
+        if self.start_time is None:
+            self.start_time = now
+
+    def answers_started(self) -> bool:
+        return self.start_time is not None
+
+    def answers(self) -> list:
+        return list(self.questions)
+
+    def get_answer(self, question_id: int):
+        """A copy of the answer sheet entry; write changes back with put_answer."""
+        entry = next((q for q in self.questions if q["question_id"] == question_id), None)
+        return dict(entry) if entry is not None else None
+
+    def update_answer(self, question_id: int, update):
+        """
+        Atomic read-modify-write of one answer sheet entry: ``update`` gets a
+        copy of the entry (or None) and returns the new entry, or None to
+        leave it unchanged. Returns what was stored.
+        """
+        with self.lock:
+            index = next((i for i, q in enumerate(self.questions) if q["question_id"] == question_id), None)
+            entry = update(dict(self.questions[index]) if index is not None else None)
+            if entry is None:
+                return None
+            if index is None:
+                self.questions.append(entry)
+            else:
+                self.questions[index] = entry
+            return entry
+
+    def put_answer(self, entry: dict):
+        with self.lock:
+            for i, q in enumerate(self.questions):
+                if q["question_id"] == entry["question_id"]:
+                    self.questions[i] = entry
+                    return
+            self.questions.append(entry)
+
+    def add_score(self, delta: int) -> int:
+        with self.lock:
+            self.score += delta
+            return self.score
+
+    def nbytes(self) -> int:
+        size = sys.getsizeof(self) + self.pose_window.nbytes + sys.getsizeof(self.questions)
+        return size + sum(sys.getsizeof(q) for q in self.questions)
+
+
+class CandidateSessionRegistry:
+    """
+    Candidate-keyed CandidateSession objects with idle eviction and a size cap.
+    Kept in least-recently-used order, so expired sessions are always at the front.
+    Only idle sessions are ever evicted: when the registry is full of active
+    ones, creating another raises SessionRegistryFull instead of dropping
+    someone's warning and pause counters.
+    """
+
+    blocking = False  # session calls are in-memory; safe on the event loop
+
+    def __init__(self, max_sessions: int = CANDIDATE_SESSION_MAX, idle_ttl: float = CANDIDATE_SESSION_IDLE_TTL):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evicted_idle = 0
+        self.rejected = 0
+
+    def get(self, candidate_id: str, create: bool = True) -> CandidateSession:
+        """The candidate's session; created (evicting stale ones) unless create=False."""
+        with self._lock:
+            session = self._sessions.get(candidate_id)
+            if session is not None:
+                self._sessions.move_to_end(candidate_id)
+                session.touch()
+                return session
+            if not create:
+                return None
+
+            self._evict_idle()
+            if len(self._sessions) >= self.max_sessions:
+                self.rejected += 1
+                raise SessionRegistryFull(f"All {self.max_sessions} candidate sessions are active")
+
+            session = CandidateSession(candidate_id)
+            self._sessions[candidate_id] = session
+            self.created += 1
+            return session
+
+    def discard(self, candidate_id: str):
+        with self._lock:
+            self._sessions.pop(candidate_id, None)
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.idle_ttl
+        while self._sessions:
+            candidate_id, oldest = next(iter(self._sessions.items()))
+            if oldest.last_used >= cutoff:
+                break
+            del self._sessions[candidate_id]
+            self.evicted_idle += 1
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def stats(self) -> dict:
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return {
+            "backend": "memory",
+            "live": len(sessions),
+            "max_sessions": self.max_sessions,
+            "idle_ttl_s": self.idle_ttl,
+            "memory_bytes": sum(s.nbytes() for s in sessions),
+            "created": self.created,
+            "evicted_idle": self.evicted_idle,
+            "rejected": self.rejected
+        }
+
+
+def create_registry(backend: str = STATE_BACKEND):
+    if backend == "memory":
+        return CandidateSessionRegistry()
+    if backend == "redis":
+        # Optional dependency; only imported when selected
+        from app.utils.redis_sessions import RedisSessionRegistry
+        return RedisSessionRegistry()
+    raise ValueError(f"Unknown STATE_BACKEND {backend!r} (expected memory or redis)")
+
+
+candidate_sessions = create_registry()
+
+
+async def run_session(fn, *args, **kwargs):
+    """
+    Call ``fn`` (a session or registry method, or a function using them) from
+    an async handler: directly for the in-memory backend, in the threadpool
+    when the backend does network round-trips (Redis).
+    """
+    if candidate_sessions.blocking:
+        return await run_in_threadpool(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
+
+
+async def open_session(candidate_id: str, registered: bool = False):
+    """
+    The candidate's session for request handlers. A new one is only created
+    for a registered candidate, so requests with made-up IDs can neither
+    fill the registry nor touch real candidates' state. Pass registered=True
+    when the caller has already checked (e.g. once per websocket).
+    """
+    session = await run_session(candidate_sessions.get, candidate_id, create=False)
+    if session is not None:
+        return session
+    if not registered and not await repositories.candidate_exists(candidate_id):
+        raise HTTPException(status_code=404, detail="Unknown candidate; register first")
+    try:
+        return await run_session(candidate_sessions.get, candidate_id)
+    except SessionRegistryFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
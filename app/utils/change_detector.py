@@ -0,0 +1,44 @@
+import os
+
+import cv2
+import numpy as np
+
+# Gating thresholds (override via environment)
+FRAME_CHANGE_THRESHOLD = float(os.getenv("FRAME_CHANGE_THRESHOLD", "4.0"))  # mean abs diff, 0-255 gray
+FRAME_REUSE_MAX = int(os.getenv("FRAME_REUSE_MAX", "5"))  # 0 disables reuse
+THUMBNAIL_SIZE = (32, 24)
+
+
+def frame_thumbnail(image: np.ndarray) -> np.ndarray:
+    """Downscaled grayscale copy of a BGR frame, cheap enough to compute on every frame."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+
+
+class ChangeDetector:
+    """
+    Decides whether a frame differs enough from the last *analysed* frame to
+    be worth running the models on. Comparing against the last analysed frame
+    (not the previous one) means slow drift still triggers a fresh pass, and
+    max_reuse bounds how many consecutive frames can reuse one verdict.
+    """
+
+    def __init__(self, threshold: float = FRAME_CHANGE_THRESHOLD, max_reuse: int = FRAME_REUSE_MAX):
+        self.threshold = threshold
+        self.max_reuse = max_reuse
+        self.reference = None
+        self.reuse_count = 0
+
+    def is_unchanged(self, thumbnail: np.ndarray) -> bool:
+        if self.reference is None or self.reuse_count >= self.max_reuse:
+            return False
+        if thumbnail.shape != self.reference.shape:
+            return False
+        if cv2.absdiff(thumbnail, self.reference).mean() >= self.threshold:
+            return False
+        self.reuse_count += 1
+        return True
+
+    def mark_analysed(self, thumbnail: np.ndarray):
+        self.reference = thumbnail
+        self.reuse_count = 0
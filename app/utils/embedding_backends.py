@@ -0,0 +1,208 @@
+"""
+Sentence-embedding backends for answer scoring, selected with EMBEDDING_BACKEND:
+
+    torch  sentence-transformers all-MiniLM-L6-v2 in PyTorch
+    onnx   the same encoder exported to ONNX (int8 by default) on ONNX Runtime,
+           with the tokenizers library and our own mean pooling; never imports torch
+
+Both return unit-length float32 rows, so cosine similarity stays a dot
+product. Export the model and check the scores before switching:
+
+    python -m app.utils.embedding_backends export
+    python -m app.utils.embedding_backends parity
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+HF_MODEL_ID = f"sentence-transformers/{MODEL_NAME}"
+MAX_SEQ_LENGTH = 256  # sentence-transformers' limit for this model
+
+# Backend selection (override via environment)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", "minilm_onnx")
+EMBEDDING_ONNX_MODEL = os.getenv("EMBEDDING_ONNX_MODEL", os.path.join(EMBEDDING_ONNX_DIR, "model-int8.onnx"))
+EMBEDDING_CPU_THREADS = int(os.getenv("EMBEDDING_CPU_THREADS", "0"))  # 0 = ONNX Runtime's default
+
+
+def _quantization(model_path: str) -> str:
+    # export() names the quantized model model-int8.onnx
+    return "int8" if "int8" in os.path.basename(model_path) else "fp32"
+
+
+def active_encoder() -> dict:
+    """Backend and weight precision create_encoder() will use, without loading the model."""
+    if EMBEDDING_BACKEND == "onnx":
+        return {"backend": "onnx", "quantization": _quantization(EMBEDDING_ONNX_MODEL)}
+    return {"backend": EMBEDDING_BACKEND, "quantization": "fp32"}
+
+
+def mean_pool(hidden: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+    """Average token embeddings (N, T, d) over unmasked tokens, then L2-normalise each row."""
+    mask = attention_mask[:, :, None].astype(np.float32)
+    pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+    norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+    return (pooled / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+
+class TorchEncoder:
+    name = "torch"
+    quantization = "fp32"
+
+    def __init__(self):
+        # Imported here: sentence_transformers pulls in torch and transformers
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(MODEL_NAME)
+
+    def encode(self, texts: list) -> np.ndarray:
+        return self.model.encode(texts, convert_to_numpy=True, normalize_embeddings=True).astype(np.float32)
+
+
+class OnnxEncoder:
+    """
+    BERT tokenization (tokenizer.json next to the model), one ONNX Runtime
+    run per batch, attention-masked mean pooling and L2 normalisation: the
+    same pipeline SentenceTransformer applies to this model.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_path: str = EMBEDDING_ONNX_MODEL, threads: int = EMBEDDING_CPU_THREADS):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.quantization = _quantization(model_path)
+        self.tokenizer = Tokenizer.from_file(os.path.join(os.path.dirname(model_path), "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, texts: list) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64)
+        }
+        hidden = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+        return mean_pool(hidden, feeds["attention_mask"])
+
+
+def create_encoder(backend: str = EMBEDDING_BACKEND):
+    if backend == "torch":
+        return TorchEncoder()
+    if backend == "onnx":
+        return OnnxEncoder()
+    raise ValueError(f"Unknown EMBEDDING_BACKEND {backend!r} (expected torch or onnx)")
+
+
+# --- offline tooling ---
+
+def export(out_dir: str = EMBEDDING_ONNX_DIR, int8: bool = True) -> str:
+    """Export the encoder to ONNX with dynamic batch/sequence axes, then quantize its weights to int8."""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(out_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(HF_MODEL_ID)
+    tokenizer.save_pretrained(out_dir)  # writes tokenizer.json for OnnxEncoder
+    model = AutoModel.from_pretrained(HF_MODEL_ID).eval()
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    fp32_path = os.path.join(out_dir, "model.onnx")
+    axes = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={"input_ids": axes, "attention_mask": axes, "token_type_ids": axes, "last_hidden_state": axes},
+            opset_version=14
+        )
+    if not int8:
+        return fp32_path
+
+    # Dynamic quantization suits transformer encoders: int8 MatMul weights, activations quantized at runtime
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    int8_path = os.path.join(out_dir, "model-int8.onnx")
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    return int8_path
+
+
+def _parity_pairs(questions_path: str = None) -> list:
+    """(answer, reference) pairs from the question bank: exact, prompt-vs-answer and mismatched answers."""
+    from app.utils.question_bank import QUESTION_BANK_FILE, load_questions
+
+    questions = load_questions(questions_path or QUESTION_BANK_FILE)
+    expected = [q["expected"] for q in questions]
+    pairs = [(e, e) for e in expected]
+    pairs += [(q["question"], q["expected"]) for q in questions]
+    pairs += [(expected[i], expected[(i + 1) % len(expected)]) for i in range(len(expected))]
+    return pairs
+
+
+def parity(model_path: str = EMBEDDING_ONNX_MODEL, tolerance: float = 0.02, questions_path: str = None) -> bool:
+    """
+    Score the question-bank pairs with both backends; every similarity must be
+    within tolerance of PyTorch. Also reports grading decisions that flip at
+    the evaluator's threshold and the encode latency of each backend.
+    """
+    from app.utils.evaluator import SIMILARITY_THRESHOLD, normalize_text
+
+    pairs = [(normalize_text(a), normalize_text(b)) for a, b in _parity_pairs(questions_path)]
+    texts = sorted({t for pair in pairs for t in pair})
+    encoders = [TorchEncoder(), OnnxEncoder(model_path)]
+
+    scores = []
+    for encoder in encoders:
+        encoder.encode(texts[:1])  # warm up
+        started = time.perf_counter()
+        vectors = dict(zip(texts, (encoder.encode([t])[0] for t in texts)))
+        elapsed = time.perf_counter() - started
+        print(f"{encoder.name}: {elapsed / len(texts) * 1000:.2f} ms/text over {len(texts)} text(s)")
+        scores.append(np.array([float(np.dot(vectors[a], vectors[b])) for a, b in pairs]))
+
+    reference, candidate = scores
+    diff = np.abs(reference - candidate)
+    flips = int(((reference > SIMILARITY_THRESHOLD) != (candidate > SIMILARITY_THRESHOLD)).sum())
+    print(f"{len(pairs)} pairs: max |diff| {diff.max():.4f}, mean {diff.mean():.4f}, "
+          f"decisions flipped at {SIMILARITY_THRESHOLD}: {flips}")
+    for i in np.flatnonzero(diff > tolerance):
+        print(f"FAIL {reference[i]:.3f} vs {candidate[i]:.3f}: {pairs[i][0][:60]!r} / {pairs[i][1][:60]!r}")
+    return bool(diff.max() <= tolerance)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(prog="python -m app.utils.embedding_backends")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_cmd = commands.add_parser("export", help="export MiniLM to ONNX (int8 by default)")
+    export_cmd.add_argument("--out", default=EMBEDDING_ONNX_DIR)
+    export_cmd.add_argument("--fp32", action="store_true", help="skip int8 quantization")
+
+    parity_cmd = commands.add_parser("parity", help="compare ONNX similarity scores with PyTorch")
+    parity_cmd.add_argument("--model", default=EMBEDDING_ONNX_MODEL)
+    parity_cmd.add_argument("--tolerance", type=float, default=0.02)
+    parity_cmd.add_argument("--questions", help="question bank JSON (default: QUESTION_BANK_FILE)")
+
+    args = parser.parse_args()
+    if args.command == "export":
+        print(export(args.out, int8=not args.fp32))
+    else:
+        sys.exit(0 if parity(args.model, args.tolerance, args.questions) else 1)
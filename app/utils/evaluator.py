@@ -1,12 +1,150 @@
-from sentence_transformers import SentenceTransformer, util
+from collections import OrderedDict
+import numpy as np
+import hashlib
+import logging
+import os
+import threading
 
-model = SentenceTransformer("all-MiniLM-L6-v2")
+from app.utils.embedding_backends import MODEL_NAME, active_encoder, create_encoder
+from app.utils.model_registry import models
+from app.utils.question_bank import question_bank
 
-def evaluate_answer(user_answer: str, expected_answer: str) -> bool:
-    embeddings = model.encode([user_answer, expected_answer], convert_to_tensor=True)
-    similarity = util.cos_sim(embeddings[0], embeddings[1]).item()
+logger = logging.getLogger(__name__)
 
-    print(f"Similarity score: {similarity:.2f}")  # Debug
+SIMILARITY_THRESHOLD = 0.7  # answers scoring above this are correct
+
+
+def _warm_up_minilm(encoder):
+    encoder.encode(["warm up"])
+
+
+# all-MiniLM-L6-v2 on EMBEDDING_BACKEND (torch or onnx)
+models.register("minilm", create_encoder, _warm_up_minilm)
+
+# Reference-answer embedding cache (override via environment)
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "1024"))
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR")  # unset = memory only
+
+
+def normalize_text(text: str) -> str:
+    # The MiniLM tokenizer is uncased and ignores runs of whitespace,
+    # so these variants embed identically and can share a cache entry
+    return " ".join((text or "").lower().split())
+
+
+def encode(text: str) -> np.ndarray:
+    """Unit-length float32 embedding, so cosine similarity is a dot product."""
+    return encode_many([text])[0]
+
+
+def encode_many(texts: list) -> np.ndarray:
+    """(len(texts), dims) unit-length float32 embeddings in one batched forward pass."""
+    return models.get("minilm").encode(list(texts))
+
+
+class EmbeddingCache:
+    """
+    Bounded LRU of expected-answer embeddings keyed on a SHA-256 of the
+    normalized text, optionally backed by one .npy file per entry on disk.
+    On disk, entries live in a subdirectory per encoder (model, backend and
+    quantization), so switching EMBEDDING_BACKEND never serves another
+    encoder's vectors.
+    """
+
+    def __init__(self, max_size: int = EMBEDDING_CACHE_SIZE, cache_dir: str = EMBEDDING_CACHE_DIR):
+        self.max_size = max_size
+        if cache_dir:
+            encoder = active_encoder()
+            cache_dir = os.path.join(cache_dir, f"{MODEL_NAME}-{encoder['backend']}-{encoder['quantization']}")
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, text: str) -> np.ndarray:
+        normalized = normalize_text(text)
+        key = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return embedding
+
+        embedding = self._load(key)
+        loaded = embedding is not None
+        if not loaded:
+            embedding = encode(normalized)
+            self._save(key, embedding)
+
+        with self._lock:
+            if loaded:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return embedding
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def _load(self, key: str):
+        if not self.cache_dir:
+            return None
+        try:
+            return np.load(self._path(key))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable embedding cache entry {key}: {str(e)}")
+            return None
+
+    def _save(self, key: str, embedding: np.ndarray):
+        if not self.cache_dir:
+            return
+        tmp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.save(f, embedding)
+            os.replace(tmp_path, self._path(key))  # atomic across workers
+        except OSError as e:
+            logger.warning(f"Could not persist embedding {key}: {str(e)}")
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "persistent": bool(self.cache_dir)
+        }
+
+
+reference_embeddings = EmbeddingCache()
+
+
+def evaluate_answer(user_answer: str, expected_answer: str = None, question_id: int = None) -> bool:
+    """
+    Score against the question bank's precomputed vector when question_id is
+    known there, otherwise against the (cached) embedding of expected_answer.
+    """
+    reference = question_bank.get_embedding(question_id) if question_id is not None else None
+    if reference is None:
+        if expected_answer is None:
+            expected_answer = question_bank.get_expected_answer(question_id)
+        if expected_answer is None:
+            raise ValueError(f"No expected answer available for question {question_id}")
+        reference = reference_embeddings.get(expected_answer)
+    similarity = float(np.dot(encode(normalize_text(user_answer)), reference))
+
+    logger.debug(f"Similarity score: {similarity:.2f}")
 
     # Threshold for correctness
-    return similarity > 0.7
+    return similarity > SIMILARITY_THRESHOLD
@@ -0,0 +1,140 @@
+import os
+import time
+import threading
+import logging
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+
+from app.utils.change_detector import ChangeDetector
+from app.utils.mediapipe_handler import MediaPipeFaceMesh
+from app.utils.head_pose_estimator import HeadPoseEstimator
+
+logger = logging.getLogger(__name__)
+
+# Pool limits (override via environment)
+FACE_SESSION_MAX = int(os.getenv("FACE_SESSION_MAX", "256"))
+FACE_SESSION_IDLE_TTL = float(os.getenv("FACE_SESSION_IDLE_TTL", "300"))  # seconds
+
+# Result of one face-analysis pass: (N, 3) pixel landmarks plus solvePnP output
+FaceAnalysis = namedtuple("FaceAnalysis", ["landmarks", "rvec", "tvec"])
+
+
+class FaceSession:
+    """
+    Tracking state for a single candidate: its own FaceMesh graph (so
+    static_image_mode=False can actually track frame-to-frame) and its own
+    pose smoothing history.
+    """
+
+    def __init__(self, candidate_id: str):
+        self.candidate_id = candidate_id
+        self.face_analyzer = MediaPipeFaceMesh()
+        # Pose is solved from the analyzer's landmarks; share its graph
+        self.pose_estimator = HeadPoseEstimator(face_mesh=self.face_analyzer.face_mesh)
+        # Last full analysis and the detector deciding when it can be reused
+        self.change_detector = ChangeDetector()
+        self.last_analysis = None
+        # MediaPipe graphs are not re-entrant; serialize frames of one candidate
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        # Guarded by the pool lock: frames holding the session, and whether it left the pool
+        self.users = 0
+        self.retired = False
+
+    def touch(self):
+        self.last_used = time.monotonic()
+
+    def analyze(self, image) -> FaceAnalysis:
+        """
+        Single FaceMesh pass for a BGR frame. Returns None when no face is found;
+        rvec/tvec are None if solvePnP fails. Caller must hold self.lock.
+        """
+        landmarks = self.face_analyzer.get_landmark_array(image)
+        if landmarks is None:
+            return None
+        img_h, img_w = image.shape[:2]
+        rvec, tvec, _ = self.pose_estimator.estimate_pose_from_landmarks(landmarks, img_w, img_h)
+        return FaceAnalysis(landmarks, rvec, tvec)
+
+    def close(self):
+        try:
+            self.face_analyzer.face_mesh.close()
+        except Exception as e:
+            logger.warning(f"Failed to close FaceMesh for {self.candidate_id}: {str(e)}")
+
+
+class FaceSessionPool:
+    """
+    Candidate-keyed pool of FaceSession objects with idle eviction and a size cap.
+    Least recently used sessions are evicted first when the cap is reached.
+
+    Sessions are borrowed with use(); evicting or releasing one that a frame
+    is still using only takes it out of the pool, and its graph is closed
+    when the last user returns it.
+    """
+
+    def __init__(self, max_sessions: int = FACE_SESSION_MAX, idle_ttl: float = FACE_SESSION_IDLE_TTL):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def use(self, candidate_id: str):
+        """Borrow the candidate's session, creating it (and evicting stale ones) if needed."""
+        session, unused = self._acquire(candidate_id)
+        # Close graphs outside the pool lock
+        for old in unused:
+            old.close()
+        try:
+            yield session
+        finally:
+            with self._lock:
+                session.users -= 1
+                close = session.retired and session.users == 0
+            if close:
+                session.close()
+
+    def _acquire(self, candidate_id: str):
+        with self._lock:
+            session = self._sessions.get(candidate_id)
+            if session is not None:
+                self._sessions.move_to_end(candidate_id)
+                session.touch()
+                session.users += 1
+                return session, []
+
+            evicted = self._evict_idle()
+            while len(self._sessions) >= self.max_sessions:
+                _, oldest = self._sessions.popitem(last=False)
+                evicted.append(oldest)
+
+            session = FaceSession(candidate_id)
+            session.users = 1
+            self._sessions[candidate_id] = session
+            return session, self._retire(evicted)
+
+    def release(self, candidate_id: str):
+        """Drop a candidate's session explicitly (e.g. after disqualification)."""
+        with self._lock:
+            session = self._sessions.pop(candidate_id, None)
+            unused = self._retire([session] if session is not None else [])
+        for old in unused:
+            old.close()
+
+    def _retire(self, sessions):
+        """Mark sessions as out of the pool; returns those no frame is using, to close now."""
+        for session in sessions:
+            session.retired = True
+        return [session for session in sessions if session.users == 0]
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.idle_ttl
+        stale = [cid for cid, s in self._sessions.items() if s.last_used < cutoff and s.users == 0]
+        return [self._sessions.pop(cid) for cid in stale]
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+face_sessions = FaceSessionPool()
@@ -0,0 +1,71 @@
+import logging
+
+import cv2
+import numpy as np
+
+from app.utils.change_detector import frame_thumbnail
+from app.utils.face_sessions import face_sessions
+from app.utils.inference_pool import FrameAnalysis, FrameDecodeError
+from app.utils.yolo_handler import get_yolo_results, summarize_detections
+
+logger = logging.getLogger(__name__)
+
+
+def decode_frame(buffer) -> np.ndarray:
+    """Decode JPEG/PNG bytes (bytes, bytearray or memoryview) without copying them first."""
+    img = cv2.imdecode(np.frombuffer(buffer, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise FrameDecodeError("Could not decode image")
+    return img
+
+
+def analyze_frame(candidate_id: str, img: np.ndarray) -> FrameAnalysis:
+    """
+    Model stage of the frames pipeline: YOLO detections plus one FaceMesh pass
+    on the candidate's tracking session. When the frame is nearly identical
+    to the last analysed one, that analysis is returned instead (``reused``).
+    """
+    thumbnail = frame_thumbnail(img)
+    with face_sessions.use(candidate_id) as session, session.lock:
+        if session.last_analysis is not None and session.change_detector.is_unchanged(thumbnail):
+            return session.last_analysis._replace(reused=True)
+
+        analysis, complete = _run_models(session, img)
+        if complete:
+            session.change_detector.mark_analysed(thumbnail)
+            session.last_analysis = analysis
+        return analysis
+
+
+def _run_models(session, img: np.ndarray):
+    """Returns (analysis, complete); incomplete analyses are never reused."""
+    mobile_detected = False
+    people_count = 0
+    yolo_ok = False
+    try:
+        detections = summarize_detections(get_yolo_results(img))
+        mobile_detected = detections.phone_detected
+        people_count = detections.person_count
+        yolo_ok = True
+    except Exception as e:
+        logger.error(f"YOLO processing failed: {str(e)}")
+
+    if mobile_detected:
+        # The candidate is banned; face analysis would be wasted work
+        return FrameAnalysis(img.shape, True, people_count, None, None, None), False
+
+    landmarks = rvec = face_error = None
+    try:
+        face = session.analyze(img)
+        if face is not None:
+            landmarks, rvec = face.landmarks, face.rvec
+    except Exception as e:
+        logger.error(f"Face analysis failed: {str(e)}", exc_info=True)
+        face_error = str(e)
+
+    analysis = FrameAnalysis(img.shape, False, people_count, landmarks, rvec, face_error)
+    return analysis, yolo_ok and face_error is None
+
+
+def analyze_encoded_frame(candidate_id: str, buffer) -> FrameAnalysis:
+    return analyze_frame(candidate_id, decode_frame(buffer))
@@ -1,11 +1,36 @@
+import logging
+
 import cv2
 import numpy as np
 import mediapipe as mp
 
+logger = logging.getLogger(__name__)
+
+
+def rotation_to_euler(rvec):
+    """
+    Convert a solvePnP rotation vector to (yaw, pitch, roll) in degrees.
+    """
+    rotation_matrix, _ = cv2.Rodrigues(rvec)
+    sy = np.sqrt(rotation_matrix[0, 0] ** 2 + rotation_matrix[1, 0] ** 2)
+    singular = sy < 1e-6
+
+    if not singular:
+        pitch = np.arctan2(rotation_matrix[2, 1], rotation_matrix[2, 2])
+        yaw = np.arctan2(-rotation_matrix[2, 0], sy)
+        roll = np.arctan2(rotation_matrix[1, 0], rotation_matrix[0, 0])
+    else:
+        pitch = np.arctan2(-rotation_matrix[1, 2], rotation_matrix[1, 1])
+        yaw = np.arctan2(-rotation_matrix[2, 0], sy)
+        roll = 0
+
+    return float(np.degrees(yaw)), float(np.degrees(pitch)), float(np.degrees(roll))
+
 
 class HeadPoseEstimator:
-    def __init__(self):
-        self.face_mesh = mp.solutions.face_mesh.FaceMesh(
+    def __init__(self, face_mesh=None):
+        # Share an existing FaceMesh graph when landmarks come from elsewhere
+        self.face_mesh = face_mesh or mp.solutions.face_mesh.FaceMesh(
             static_image_mode=False,
             max_num_faces=1,
             refine_landmarks=True,
@@ -61,35 +86,50 @@ class HeadPoseEstimator:
                 for i in self.landmark_indices
             ], dtype=np.float64)
 
-            # Camera matrix
-            focal_length = img_w
-            center = (img_w / 2, img_h / 2)
-            camera_matrix = np.array([
-                [focal_length, 0, center[0]],
-                [0, focal_length, center[1]],
-                [0, 0, 1]
-            ], dtype=np.float64)
+            return self._solve(image_points, img_w, img_h)
 
-            # Solve PnP with RANSAC
-            _, rvec, tvec = cv2.solvePnP(
-                self.model_points,
-                image_points,
-                camera_matrix,
-                np.zeros((4, 1)),
-                flags=cv2.SOLVEPNP_ITERATIVE,
-                useExtrinsicGuess=False
-            )
+        except Exception as e:
+            logger.warning(f"Pose estimation error: {str(e)}")
+            return None, None, None
 
-            # Apply smoothing
-            if self.prev_rvec is not None:
-                rvec = self.smoothing_factor * rvec + (1 - self.smoothing_factor) * self.prev_rvec
-                tvec = self.smoothing_factor * tvec + (1 - self.smoothing_factor) * self.prev_tvec
+    def estimate_pose_from_landmarks(self, landmarks: np.ndarray, img_w: int, img_h: int):
+        """
+        Estimate pose from an (N, 3) pixel-space landmark array produced by
+        MediaPipeFaceMesh.get_landmark_array, without running the mesh again.
+        """
+        try:
+            image_points = landmarks[self.landmark_indices, :2].astype(np.float64)
+            return self._solve(image_points, img_w, img_h)
+        except Exception as e:
+            logger.warning(f"Pose estimation error: {str(e)}")
+            return None, None, None
 
-            self.prev_rvec = rvec
-            self.prev_tvec = tvec
+    def _solve(self, image_points, img_w, img_h):
+        # Camera matrix
+        focal_length = img_w
+        center = (img_w / 2, img_h / 2)
+        camera_matrix = np.array([
+            [focal_length, 0, center[0]],
+            [0, focal_length, center[1]],
+            [0, 0, 1]
+        ], dtype=np.float64)
 
-            return rvec, tvec, camera_matrix
+        # Solve PnP with RANSAC
+        _, rvec, tvec = cv2.solvePnP(
+            self.model_points,
+            image_points,
+            camera_matrix,
+            np.zeros((4, 1)),
+            flags=cv2.SOLVEPNP_ITERATIVE,
+            useExtrinsicGuess=False
+        )
 
-        except Exception as e:
-            print(f"Pose estimation error: {e}")
-            return None, None, None
\ No newline at end of file
+        # Apply smoothing
+        if self.prev_rvec is not None:
+            rvec = self.smoothing_factor * rvec + (1 - self.smoothing_factor) * self.prev_rvec
+            tvec = self.smoothing_factor * tvec + (1 - self.smoothing_factor) * self.prev_tvec
+
+        self.prev_rvec = rvec
+        self.prev_tvec = tvec
+
+        return rvec, tvec, camera_matrix
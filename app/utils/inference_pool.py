@@ -0,0 +1,234 @@
+import os
+import time
+import zlib
+import asyncio
+import logging
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+# Pool sizing (override via environment); 0 workers runs inference in-process
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0"))
+INFERENCE_WORKER_THREADS = int(os.getenv("INFERENCE_WORKER_THREADS", "1"))
+
+# Everything the decision logic needs from one frame. Kept free of model
+# types so it pickles cheaply and the parent never has to import the models.
+FrameAnalysis = namedtuple(
+    "FrameAnalysis",
+    ["image_shape", "mobile_detected", "people_count", "landmarks", "rvec", "face_error", "reused"],
+    defaults=(False,)
+)
+
+
+class FrameDecodeError(ValueError):
+    """Raised when the uploaded bytes are not a decodable image."""
+
+
+def _init_worker(threads: int):
+    # Must run before numpy/torch/cv2 spin up their own thread pools
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    # A worker handles one frame at a time, so there is nothing to micro-batch
+    os.environ["YOLO_BATCH_MAX"] = "1"
+    os.environ.setdefault("YOLO_CPU_THREADS", str(threads))  # ONNX Runtime / OpenVINO backends
+
+    import cv2
+    cv2.setNumThreads(threads)
+    if os.getenv("YOLO_BACKEND", "torch") == "torch":
+        # The exported backends never import torch; don't pay for it there
+        try:
+            import torch
+            torch.set_num_threads(threads)
+        except ImportError:
+            pass
+
+    # Registers YOLO and sets up this worker's FaceMesh session pool, then
+    # loads and warms the model before the first frame is accepted
+    import app.utils.frame_analysis  # noqa: F401
+    from app.utils.model_registry import models
+    models.preload()
+    logger.info(f"Inference worker {os.getpid()} ready ({threads} thread(s))")
+
+
+def _worker_models():
+    from app.utils.model_registry import models
+    return models.states()
+
+
+def _run_in_worker(candidate_id: str, buffer: bytes):
+    from app.utils.frame_analysis import analyze_encoded_frame
+    started = time.perf_counter()
+    analysis = analyze_encoded_frame(candidate_id, buffer)
+    return analysis, time.perf_counter() - started
+
+
+def _release_in_worker(candidate_id: str):
+    from app.utils.face_sessions import face_sessions
+    face_sessions.release(candidate_id)
+
+
+class _Worker:
+    def __init__(self, index: int, threads: int):
+        self.index = index
+        self.threads = threads
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.busy_seconds = 0.0
+        self.restarts = 0
+        self.executor = None
+        self.started_at = None
+        self.warmup = None
+        self.start()
+
+    def start(self):
+        self.executor = ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.threads,)
+        )
+        self.started_at = time.monotonic()
+        # Processes spawn on first submit; do it now so models load before traffic
+        self.warmup = self.executor.submit(_worker_models)
+
+    def readiness(self) -> dict:
+        if not self.warmup.done():
+            return {"state": "loading"}
+        try:
+            model_states = self.warmup.result()
+        except Exception as e:
+            return {"state": "failed", "error": str(e)}
+        ready = all(m["state"] == "ready" for m in model_states.values())
+        return {"state": "ready" if ready else "failed", "models": model_states}
+
+    def restart(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.restarts += 1
+        self.start()
+
+    def stats(self) -> dict:
+        uptime = time.monotonic() - self.started_at
+        return {
+            "worker": self.index,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "in_flight": self.in_flight,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "utilization": round(self.busy_seconds / uptime, 3) if uptime > 0 else 0,
+            "avg_frame_ms": round(self.busy_seconds / self.completed * 1000, 2) if self.completed else 0,
+            "restarts": self.restarts
+        }
+
+
+class InferencePool:
+    """
+    Dedicated inference processes for the frames pipeline. Each worker is a
+    single-process executor that loads YOLO and its own FaceMesh sessions
+    once. Candidates are pinned to a worker by a stable hash of their ID so
+    their tracking state stays in one process.
+
+    With zero workers, frames are analysed in Starlette's threadpool instead.
+    """
+
+    def __init__(self, workers: int = INFERENCE_WORKERS, threads: int = INFERENCE_WORKER_THREADS):
+        self.size = workers
+        self.threads = threads
+        self._workers = []
+        self.analyzed = 0
+        self.reused = 0  # frames answered with the previous analysis (unchanged scene)
+
+    def start(self):
+        if self.size <= 0:
+            # In-process mode: register the frame models with this process's registry
+            import app.utils.frame_analysis  # noqa: F401
+            return
+        if not self._workers:
+            self._workers = [_Worker(i, self.threads) for i in range(self.size)]
+            logger.info(f"Started {self.size} inference worker(s), {self.threads} thread(s) each")
+
+    def shutdown(self):
+        for worker in self._workers:
+            worker.executor.shutdown(wait=True, cancel_futures=True)
+        self._workers = []
+
+    def _worker_for(self, candidate_id: str) -> _Worker:
+        return self._workers[zlib.crc32(candidate_id.encode("utf-8")) % len(self._workers)]
+
+    async def analyze(self, candidate_id: str, buffer) -> FrameAnalysis:
+        """Decode and analyse an encoded frame without blocking the event loop."""
+        if not self._workers:
+            from app.utils.frame_analysis import analyze_encoded_frame
+            analysis = await run_in_threadpool(analyze_encoded_frame, candidate_id, buffer)
+        else:
+            analysis = await self._analyze_in_worker(candidate_id, buffer)
+        self.analyzed += 1
+        if analysis.reused:
+            self.reused += 1
+        return analysis
+
+    async def _analyze_in_worker(self, candidate_id: str, buffer) -> FrameAnalysis:
+        worker = self._worker_for(candidate_id)
+        worker.submitted += 1
+        worker.in_flight += 1
+        executor = worker.executor
+        try:
+            future = executor.submit(_run_in_worker, candidate_id, bytes(buffer))
+            analysis, busy = await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            worker.failed += 1
+            # Concurrent failures on the same dead executor restart it only once
+            if worker.executor is executor:
+                logger.error(f"Inference worker {worker.index} died; restarting")
+                worker.restart()
+            raise
+        except Exception:
+            worker.failed += 1
+            raise
+        finally:
+            worker.in_flight -= 1
+
+        worker.completed += 1
+        worker.busy_seconds += busy
+        return analysis
+
+    def release(self, candidate_id: str):
+        """Drop the candidate's tracking session wherever it lives."""
+        if not self._workers:
+            from app.utils.face_sessions import face_sessions
+            face_sessions.release(candidate_id)
+            return
+        try:
+            self._worker_for(candidate_id).executor.submit(_release_in_worker, candidate_id)
+        except Exception as e:
+            logger.warning(f"Could not release session for {candidate_id}: {str(e)}")
+
+    def readiness(self) -> dict:
+        """Per-worker model state for /ready; empty in in-process mode (see the model registry)."""
+        return {f"inference_worker_{w.index}": w.readiness() for w in self._workers}
+
+    def stats(self) -> dict:
+        frames = {
+            "frames_analyzed": self.analyzed,
+            "frames_reused": self.reused,
+            "reuse_ratio": round(self.reused / self.analyzed, 3) if self.analyzed else 0
+        }
+        if not self._workers:
+            return {"mode": "in_process", **frames}
+        return {
+            "mode": "process_pool",
+            **frames,
+            "workers": self.size,
+            "threads_per_worker": self.threads,
+            "per_worker": [worker.stats() for worker in self._workers]
+        }
+
+
+inference_pool = InferencePool()
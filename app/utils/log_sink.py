@@ -0,0 +1,214 @@
+import csv
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:  # optional; only needed for LOG_SINK_FORMAT=parquet|arrow
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+# Buffered analytics logs (override via environment)
+LOG_DIR = os.getenv("LOG_SINK_DIR", os.path.join("app", "logs"))
+LOG_SINK_FORMAT = os.getenv("LOG_SINK_FORMAT", "csv")  # csv | parquet | arrow
+LOG_SINK_FLUSH_ROWS = int(os.getenv("LOG_SINK_FLUSH_ROWS", "1000"))
+LOG_SINK_FLUSH_MS = int(os.getenv("LOG_SINK_FLUSH_MS", "2000"))
+LOG_SINK_ROTATE_SECONDS = int(os.getenv("LOG_SINK_ROTATE_SECONDS", "3600"))
+LOG_SINK_ROTATE_ROWS = int(os.getenv("LOG_SINK_ROTATE_ROWS", "500000"))
+
+EXTENSIONS = {"csv": "csv", "parquet": "parquet", "arrow": "arrows"}
+
+
+def _arrow_type(kind: str):
+    return {
+        "str": pa.string(),
+        "float": pa.float64(),
+        "int": pa.int64(),
+        "bool": pa.bool_(),
+        "timestamp": pa.timestamp("us")
+    }[kind]
+
+
+class RotatingLogSink:
+    """
+    Per-process buffered log writer. Rows are appended to a list in memory and
+    written in batches by a background thread every flush_rows rows or
+    flush_ms milliseconds. Files rotate by age or row count and carry the
+    process ID in their name, so each uvicorn worker owns its files and no
+    cross-process lock is needed.
+
+    ``fields`` maps column name to one of str/float/int/bool/timestamp; the
+    types are only used for the columnar (parquet, arrow IPC stream) formats.
+    """
+
+    def __init__(self, name: str, fields: dict, directory: str = LOG_DIR, fmt: str = LOG_SINK_FORMAT,
+                 flush_rows: int = LOG_SINK_FLUSH_ROWS, flush_ms: int = LOG_SINK_FLUSH_MS,
+                 rotate_seconds: int = LOG_SINK_ROTATE_SECONDS, rotate_rows: int = LOG_SINK_ROTATE_ROWS):
+        if fmt not in EXTENSIONS:
+            raise ValueError(f"Unknown log sink format {fmt!r}")
+        if fmt != "csv" and pa is None:
+            logger.warning(f"pyarrow not installed; writing {name} logs as CSV")
+            fmt = "csv"
+        self.name = name
+        self.fields = fields
+        self.directory = directory
+        self.fmt = fmt
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_ms / 1000
+        self.rotate_seconds = rotate_seconds
+        self.rotate_rows = rotate_rows
+        self.schema = pa.schema([(f, _arrow_type(t)) for f, t in fields.items()]) if fmt != "csv" else None
+
+        self._rows = []
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+        self._pid = None
+        self._file = None
+        self._writer = None
+        self._path = None
+        self._opened_at = 0.0
+        self._file_rows = 0
+        self.rows_written = 0
+        self.files_opened = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, row: dict):
+        """Queue one row (missing fields are written as empty/null)."""
+        with self._cond:
+            if self._thread is None or self._pid != os.getpid():
+                self._start()
+            self._rows.append(row)
+            if len(self._rows) >= self.flush_rows:
+                self._cond.notify()
+
+    def _start(self):
+        # Called with _cond held; also restarts the flusher in a forked child
+        self._pid = os.getpid()
+        self._file = self._writer = None
+        self._stopping = False
+        self._thread = threading.Thread(target=self._loop, name=f"log-sink-{self.name}", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait(self.flush_interval)
+                stopping = self._stopping
+            self.flush()
+            if stopping:
+                return
+
+    def flush(self):
+        with self._write_lock:
+            with self._cond:
+                rows, self._rows = self._rows, []
+            if not rows:
+                return
+            try:
+                self._rotate_if_needed()
+                self._write_rows(rows)
+                self.rows_written += len(rows)
+            except Exception as e:
+                logger.error(f"{self.name} log flush failed, {len(rows)} rows lost: {str(e)}")
+                self._close_file()
+
+    def close(self):
+        """Flush everything and finalize the current file (writes the parquet footer)."""
+        with self._cond:
+            thread, self._thread = self._thread, None
+            self._stopping = True
+            self._cond.notify_all()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        self.flush()
+        with self._write_lock:
+            self._close_file()
+
+    def _rotate_if_needed(self):
+        expired = time.monotonic() - self._opened_at >= self.rotate_seconds
+        if self._file is None or expired or self._file_rows >= self.rotate_rows:
+            self._close_file()
+            self._open_file()
+
+    def _open_file(self):
+        stamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+        self._path = os.path.join(self.directory, f"{self.name}-{stamp}-{os.getpid()}.{EXTENSIONS[self.fmt]}")
+        if self.fmt == "csv":
+            self._file = open(self._path, mode="a", newline="", encoding="utf-8")
+            self._writer = csv.DictWriter(self._file, fieldnames=list(self.fields), extrasaction="ignore")
+            self._writer.writeheader()
+        elif self.fmt == "parquet":
+            self._file = self._writer = pq.ParquetWriter(self._path, self.schema)
+        else:
+            # IPC stream format stays readable up to the last batch even if never closed
+            self._file = pa.OSFile(self._path, "wb")
+            self._writer = pa.ipc.new_stream(self._file, self.schema)
+        self._opened_at = time.monotonic()
+        self._file_rows = 0
+        self.files_opened += 1
+
+    def _write_rows(self, rows: list):
+        if self.fmt == "csv":
+            self._writer.writerows(rows)
+            self._file.flush()
+        else:
+            table = pa.Table.from_pylist(rows, schema=self.schema)
+            self._writer.write_table(table)  # one row group / record batch per flush
+        self._file_rows += len(rows)
+
+    def _close_file(self):
+        if self._file is None:
+            return
+        try:
+            if self.fmt != "csv":
+                self._writer.close()
+            if self._file is not self._writer:
+                self._file.close()
+        except Exception as e:
+            logger.warning(f"Closing {self._path} failed: {str(e)}")
+        self._file = self._writer = None
+
+    def stats(self) -> dict:
+        return {
+            "format": self.fmt,
+            "buffered": len(self._rows),
+            "rows_written": self.rows_written,
+            "files_opened": self.files_opened,
+            "current_file": self._path
+        }
+
+
+pose_log_sink = RotatingLogSink("pose_logs", {
+    "timestamp": "timestamp",
+    "candidate_id": "str",
+    "yaw": "float",
+    "pitch": "float",
+    "roll": "float",
+    "cheating": "bool",
+    "reason": "str",
+    "warning": "str"
+})
+
+cheating_log_sink = RotatingLogSink("cheating_logs", {
+    "timestamp": "timestamp",
+    "candidate_id": "str",
+    "candidate_name": "str",
+    "cheating_type": "str",
+    "yaw": "float",
+    "pitch": "float",
+    "roll": "float",
+    "warning_count": "int"
+})
+
+
+def close_log_sinks():
+    for sink in (pose_log_sink, cheating_log_sink):
+        sink.close()
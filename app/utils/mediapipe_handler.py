@@ -40,6 +40,7 @@
 #         )
 #         return image
 
+import base64
 import cv2
 import mediapipe as mp
 import numpy as np
@@ -67,22 +68,30 @@ class MediaPipeFaceMesh:
             return result.multi_face_landmarks[0]
         return None
 
-    def get_all_landmarks(self, image: np.ndarray):
-        """Return full list of 468 landmark coordinates in (x, y, z)"""
+    def get_landmark_array(self, image: np.ndarray):
+        """
+        Run the mesh once and return landmarks as a float32 array of shape (N, 3):
+        x/y in pixels, z in MediaPipe's relative depth units. None if no face.
+        """
         rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
         result = self.face_mesh.process(rgb_image)
-        if result.multi_face_landmarks:
-            face_landmarks = result.multi_face_landmarks[0]
-            h, w, _ = image.shape
-            return [
-                {
-                    "x": int(lm.x * w),
-                    "y": int(lm.y * h),
-                    "z": lm.z
-                }
-                for lm in face_landmarks.landmark
-            ]
-        return []
+        if not result.multi_face_landmarks:
+            return None
+        h, w = image.shape[:2]
+        points = np.array(
+            [(lm.x, lm.y, lm.z) for lm in result.multi_face_landmarks[0].landmark],
+            dtype=np.float32
+        )
+        points[:, 0] *= w
+        points[:, 1] *= h
+        return points
+
+    def get_all_landmarks(self, image: np.ndarray):
+        """Return full list of 468 landmark coordinates in (x, y, z)"""
+        points = self.get_landmark_array(image)
+        if points is None:
+            return []
+        return landmarks_to_dicts(points)
 
     def draw_landmarks(self, image: np.ndarray, landmarks) -> np.ndarray:
         if landmarks is None:
@@ -95,3 +104,36 @@ class MediaPipeFaceMesh:
             connection_drawing_spec=mp_drawing_styles.get_default_face_mesh_tesselation_style()
         )
         return image
+
+
+def landmarks_to_dicts(points: np.ndarray) -> list:
+    """Convert an (N, 3) landmark array into the legacy list of {x, y, z} dicts."""
+    xy = points[:, :2].astype(np.int32).tolist()
+    z = points[:, 2].tolist()
+    return [{"x": x, "y": y, "z": depth} for (x, y), depth in zip(xy, z)]
+
+
+# Quantization for the compact landmark encoding: x/y are whole pixels,
+# z (relative depth, roughly -0.3..0.3) is scaled before rounding to int16.
+LANDMARK_Z_SCALE = 10000
+
+
+def encode_landmarks(points: np.ndarray, indices=None) -> dict:
+    """
+    Compact landmark payload: (K, 3) int16 array, little-endian, base64 encoded.
+    Decode with int16 frombuffer -> reshape(shape) -> divide column 2 by z_scale.
+    """
+    if indices is not None:
+        points = points[indices]
+    quantized = np.empty(points.shape, dtype="<i2")
+    quantized[:, :2] = np.clip(np.rint(points[:, :2]), -32768, 32767)
+    quantized[:, 2] = np.clip(np.rint(points[:, 2] * LANDMARK_Z_SCALE), -32768, 32767)
+    payload = {
+        "encoding": "int16-base64",
+        "shape": list(quantized.shape),
+        "z_scale": LANDMARK_Z_SCALE,
+        "data": base64.b64encode(quantized.tobytes()).decode("ascii")
+    }
+    if indices is not None:
+        payload["indices"] = list(indices)
+    return payload
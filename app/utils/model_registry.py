@@ -0,0 +1,118 @@
+import os
+import time
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# When to load registered models (override via environment):
+#   background - start loading all of them in parallel at startup, serve /ready meanwhile
+#   blocking   - same, but startup waits until every model is warm
+#   lazy       - load each model on first use only
+MODEL_PRELOAD = os.getenv("MODEL_PRELOAD", "background")
+
+
+class ModelEntry:
+    def __init__(self, name: str, loader, warmup=None):
+        self.name = name
+        self.loader = loader
+        self.warmup = warmup
+        self.model = None
+        self.state = "not_loaded"  # not_loaded | loading | ready | failed
+        self.error = None
+        self.load_ms = None
+        self.warmup_ms = None
+        self.lock = threading.Lock()
+
+    def to_dict(self) -> dict:
+        data = {"state": self.state}
+        if self.load_ms is not None:
+            data["load_ms"] = self.load_ms
+        if self.warmup_ms is not None:
+            data["warmup_ms"] = self.warmup_ms
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+class ModelRegistry:
+    """
+    One shared instance of every model in the process, loaded on first use
+    or preloaded in parallel at startup. Each handler module registers a
+    loader (which also does its heavy imports) and an optional warm-up that
+    runs one dummy inference, so the first real request does not pay for
+    lazy initialisation inside the framework either.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._preload_thread = None
+
+    def register(self, name: str, loader, warmup=None):
+        with self._lock:
+            if name not in self._entries:
+                self._entries[name] = ModelEntry(name, loader, warmup)
+
+    def get(self, name: str):
+        """The loaded model, loading (and warming) it now if needed."""
+        entry = self._entries[name]
+        if entry.state == "ready":
+            return entry.model
+        return self._load(entry)
+
+    def _load(self, entry: ModelEntry):
+        with entry.lock:
+            if entry.state == "ready":
+                return entry.model
+            entry.state = "loading"
+            entry.error = None
+            try:
+                started = time.perf_counter()
+                model = entry.loader()
+                entry.load_ms = round((time.perf_counter() - started) * 1000, 1)
+                if entry.warmup is not None:
+                    started = time.perf_counter()
+                    entry.warmup(model)
+                    entry.warmup_ms = round((time.perf_counter() - started) * 1000, 1)
+            except Exception as e:
+                entry.state = "failed"
+                entry.error = str(e)
+                logger.error(f"Loading model {entry.name} failed: {str(e)}")
+                raise
+            entry.model = model
+            entry.state = "ready"
+            logger.info(f"Model {entry.name} ready (load {entry.load_ms} ms, warm-up {entry.warmup_ms} ms)")
+            return model
+
+    def preload(self, names=None):
+        """Load the given (default: all registered) models in parallel and wait for them."""
+        entries = [self._entries[n] for n in names] if names else list(self._entries.values())
+        if not entries:
+            return
+        with ThreadPoolExecutor(max_workers=len(entries), thread_name_prefix="model-load") as executor:
+            for future in [executor.submit(self._load, entry) for entry in entries]:
+                try:
+                    future.result()
+                except Exception:
+                    pass  # recorded on the entry and reported by /ready
+
+    def start(self, mode: str = MODEL_PRELOAD):
+        """Startup hook: preload according to MODEL_PRELOAD."""
+        if mode == "blocking":
+            self.preload()
+        elif mode == "background" and self._preload_thread is None:
+            self._preload_thread = threading.Thread(target=self.preload, name="model-preload", daemon=True)
+            self._preload_thread.start()
+
+    def states(self) -> dict:
+        return {name: entry.to_dict() for name, entry in self._entries.items()}
+
+    def is_ready(self) -> bool:
+        # With lazy loading nothing is loaded up front, so only failures count
+        wanted = ("ready", "not_loaded") if MODEL_PRELOAD == "lazy" else ("ready",)
+        return all(entry.state in wanted for entry in self._entries.values())
+
+
+models = ModelRegistry()
@@ -1,33 +1,22 @@
-violation_window = {}
+def classify_pose(yaw, pitch, roll):
+    """Reason string if this pose is out of bounds, else None."""
+    if abs(yaw) > 55:
+        return f"Looking too far left/right (Yaw: {yaw:.1f}°)"
+    elif pitch < -35:
+        return f"Looking down too much (Pitch: {pitch:.1f}°)"
+    elif pitch > 85:
+        return f"Looking up too much (Pitch: {pitch:.1f}°)"
+    elif abs(roll) > 30:
+        return f"Head tilted (Roll: {roll:.1f}°)"
+    return None
 
-def check_pose_violation(candidate_id, yaw, pitch, roll, now):
+def check_pose_violation(session, yaw, pitch, roll, now):
     """
     Improved cheating logic with time-based buffer and smoother thresholds.
+    The violation window lives on the candidate's session.
     """
     if yaw is None or pitch is None or roll is None:
         return None
 
-    if candidate_id not in violation_window:
-        violation_window[candidate_id] = {"start": None, "reason": None}
-
-    reason = None
-    if abs(yaw) > 55:
-        reason = f"Looking too far left/right (Yaw: {yaw:.1f}°)"
-    elif pitch < -35:
-        reason = f"Looking down too much (Pitch: {pitch:.1f}°)"
-    elif pitch > 85:
-        reason = f"Looking up too much (Pitch: {pitch:.1f}°)"
-    elif abs(roll) > 30:
-        reason = f"Head tilted (Roll: {roll:.1f}°)"
-
-    if reason:
-        if violation_window[candidate_id]["start"] is None:
-            violation_window[candidate_id] = {"start": now, "reason": reason}
-        else:
-            delta = (now - violation_window[candidate_id]["start"]).total_seconds()
-            if delta >= 3:  # ⏱️ sustain for 3 seconds
-                return violation_window[candidate_id]["reason"]
-    else:
-        violation_window[candidate_id] = {"start": None, "reason": None}
-
-    return None
+    # ⏱️ must be sustained for POSE_SUSTAIN_SECONDS (3s)
+    return session.sustained_pose_violation(classify_pose(yaw, pitch, roll), now)
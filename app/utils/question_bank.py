@@ -0,0 +1,141 @@
+"""
+Server-side question bank with precomputed expected-answer embeddings.
+
+Build the index offline (re-run whenever questions.json changes):
+
+    python -m app.utils.question_bank
+
+This writes a float32 .npy matrix (one unit-length row per question) and a
+JSON index mapping question IDs to rows. The API memory-maps the matrix, so
+every uvicorn worker shares the same pages and nothing is re-encoded at startup.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+from app.utils.embedding_backends import MODEL_NAME, active_encoder
+
+logger = logging.getLogger(__name__)
+
+# File locations (override via environment)
+QUESTION_BANK_FILE = os.getenv("QUESTION_BANK_FILE", os.path.join("app", "data", "questions.json"))
+QUESTION_BANK_EMBEDDINGS = os.getenv("QUESTION_BANK_EMBEDDINGS", os.path.join("app", "data", "question_bank.npy"))
+QUESTION_BANK_INDEX = os.getenv("QUESTION_BANK_INDEX", os.path.join("app", "data", "question_bank_index.json"))
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def load_questions(path: str = QUESTION_BANK_FILE) -> list:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build_index(questions_path: str = QUESTION_BANK_FILE,
+                embeddings_path: str = QUESTION_BANK_EMBEDDINGS,
+                index_path: str = QUESTION_BANK_INDEX):
+    """Encode every expected answer once and write the .npy matrix plus its ID index."""
+    from app.utils.evaluator import encode_many, normalize_text
+    from app.utils.model_registry import models
+
+    questions = load_questions(questions_path)
+    matrix = encode_many([normalize_text(q["expected"]) for q in questions]).astype(np.float32)
+    np.save(embeddings_path, matrix)
+
+    encoder = models.get("minilm")
+    index = {
+        "model": MODEL_NAME,
+        # Scores are only comparable between vectors from the same backend/precision
+        "backend": encoder.name,
+        "quantization": encoder.quantization,
+        "questions": [
+            {"id": q["id"], "row": row, "expected_sha256": _text_hash(q["expected"])}
+            for row, q in enumerate(questions)
+        ]
+    }
+    with open(index_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2)
+    logger.info(f"Wrote {len(questions)} question embeddings to {embeddings_path}")
+    return matrix.shape
+
+
+class QuestionBank:
+    """Lazily loaded question texts plus the memory-mapped embedding matrix."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._questions = {}
+        self._rows = {}
+        self._matrix = None
+
+    def _load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            try:
+                self._questions = {q["id"]: q for q in load_questions()}
+            except (OSError, ValueError) as e:
+                logger.warning(f"Question bank unavailable: {str(e)}")
+                return
+
+            try:
+                with open(QUESTION_BANK_INDEX, encoding="utf-8") as f:
+                    index = json.load(f)
+                matrix = np.load(QUESTION_BANK_EMBEDDINGS, mmap_mode="r")
+            except (OSError, ValueError) as e:
+                logger.warning(f"Question bank embeddings not built, falling back to on-demand encoding: {str(e)}")
+                return
+
+            if index.get("model") != MODEL_NAME:
+                logger.warning(f"Question bank built with {index.get('model')}, expected {MODEL_NAME}; ignoring it")
+                return
+            # Indexes from before the backend was recorded were all built with PyTorch
+            built = {"backend": index.get("backend", "torch"), "quantization": index.get("quantization", "fp32")}
+            if built != active_encoder():
+                logger.warning(f"Question bank built with {built}, but answers are encoded with {active_encoder()}; "
+                               f"ignoring it (rebuild with python -m app.utils.question_bank)")
+                return
+
+            for entry in index["questions"]:
+                question = self._questions.get(entry["id"])
+                # Skip rows whose text changed since the index was built
+                if question is not None and _text_hash(question["expected"]) == entry["expected_sha256"]:
+                    self._rows[entry["id"]] = entry["row"]
+            self._matrix = matrix
+
+    def get_question(self, question_id: int):
+        self._load()
+        return self._questions.get(question_id)
+
+    def get_expected_answer(self, question_id: int):
+        question = self.get_question(question_id)
+        return question["expected"] if question else None
+
+    def get_embedding(self, question_id: int):
+        """Precomputed unit-length embedding for the question's expected answer, or None."""
+        self._load()
+        row = self._rows.get(question_id)
+        if row is None or self._matrix is None:
+            return None
+        return self._matrix[row]
+
+    def list_questions(self) -> list:
+        """Question IDs and prompts only; expected answers stay on the server."""
+        self._load()
+        return [{"id": q["id"], "question": q["question"]} for q in self._questions.values()]
+
+
+question_bank = QuestionBank()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    shape = build_index()
+    print(f"Question bank index built: {shape[0]} questions x {shape[1]} dims")
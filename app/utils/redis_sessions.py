@@ -0,0 +1,214 @@
+"""
+Candidate session state on a Redis-protocol server (Redis, Valkey, KeyDB...),
+selected with STATE_BACKEND=redis so several uvicorn workers or nodes see the
+same counters, pose window and answer sheet.
+
+Every read-modify-write is a single Lua script or MULTI pipeline, so frames of
+one candidate handled by different processes cannot interleave. All keys of a
+candidate expire after CANDIDATE_SESSION_IDLE_TTL seconds without writes,
+which replaces the in-process registry's idle eviction.
+"""
+import json
+import logging
+import os
+
+import redis
+
+from app.utils.candidate_sessions import (
+    CANDIDATE_SESSION_IDLE_TTL, MAX_WARNINGS, POSE_SUSTAIN_SECONDS, POSE_WINDOW, WARNING_PAUSE_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_KEY_PREFIX = os.getenv("REDIS_KEY_PREFIX", "proctor")
+
+# KEYS[1] pose list; ARGV yaw, pitch, window, ttl -> {mean yaw, mean pitch} as strings
+ADD_POSE = """
+redis.call('RPUSH', KEYS[1], ARGV[1] .. ',' .. ARGV[2])
+redis.call('LTRIM', KEYS[1], -tonumber(ARGV[3]), -1)
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+local items = redis.call('LRANGE', KEYS[1], 0, -1)
+local yaw, pitch = 0, 0
+for _, item in ipairs(items) do
+    local y, p = string.match(item, '([^,]+),([^,]+)')
+    yaw = yaw + tonumber(y)
+    pitch = pitch + tonumber(p)
+end
+return {tostring(yaw / #items), tostring(pitch / #items)}
+"""
+
+# KEYS[1] state hash; ARGV reason ('' = none), now, sustain seconds, ttl -> reason or nil
+SUSTAINED_VIOLATION = """
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+if ARGV[1] == '' then
+    redis.call('HDEL', KEYS[1], 'violation_start', 'violation_reason')
+    return false
+end
+local start = redis.call('HGET', KEYS[1], 'violation_start')
+if not start then
+    redis.call('HSET', KEYS[1], 'violation_start', ARGV[2], 'violation_reason', ARGV[1])
+    return false
+end
+if tonumber(ARGV[2]) - tonumber(start) >= tonumber(ARGV[3]) then
+    return redis.call('HGET', KEYS[1], 'violation_reason')
+end
+return false
+"""
+
+# KEYS[1] state hash; ARGV now, pause seconds, max warnings, ttl -> violation count
+RECORD_VIOLATION = """
+local count = redis.call('HINCRBY', KEYS[1], 'violations', 1)
+if count <= tonumber(ARGV[3]) then
+    redis.call('HSET', KEYS[1], 'pause_until', tostring(tonumber(ARGV[1]) + tonumber(ARGV[2])))
+end
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return count
+"""
+
+
+class RedisCandidateSession:
+    """
+    Same methods as CandidateSession, backed by three keys per candidate:
+    a state hash (counters, pause, violation timer, score), a pose list and
+    an answers hash (question_id -> JSON entry). Holds no state of its own.
+    """
+
+    def __init__(self, registry, candidate_id: str):
+        self.registry = registry
+        self.candidate_id = candidate_id
+        prefix = f"{REDIS_KEY_PREFIX}:cand:{candidate_id}"
+        self.state_key = f"{prefix}:state"
+        self.pose_key = f"{prefix}:pose"
+        self.answers_key = f"{prefix}:answers"
+
+    @property
+    def _redis(self):
+        return self.registry.client
+
+    @property
+    def _ttl(self) -> int:
+        return int(self.registry.idle_ttl)
+
+    # --- proctoring ---
+
+    def pause_remaining(self, now) -> int:
+        pause_until = self._redis.hget(self.state_key, "pause_until")
+        if pause_until is None:
+            return None
+        remaining = float(pause_until) - now.timestamp()
+        return int(remaining) if remaining > 0 else None
+
+    def add_pose(self, yaw: float, pitch: float):
+        mean_yaw, mean_pitch = self.registry.add_pose(
+            keys=[self.pose_key], args=[yaw, pitch, POSE_WINDOW, self._ttl]
+        )
+        return float(mean_yaw), float(mean_pitch)
+
+    def sustained_pose_violation(self, reason, now):
+        result = self.registry.sustained_violation(
+            keys=[self.state_key], args=[reason or "", now.timestamp(), POSE_SUSTAIN_SECONDS, self._ttl]
+        )
+        return result.decode("utf-8") if result is not None else None
+
+    def face_failures(self) -> int:
+        return int(self._redis.hget(self.state_key, "face_failures") or 0)
+
+    def record_face_failure(self) -> int:
+        with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hincrby(self.state_key, "face_failures", 1)
+            pipe.expire(self.state_key, self._ttl)
+            count, _ = pipe.execute()
+        return count
+
+    def record_violation(self, now) -> int:
+        return self.registry.record_violation(
+            keys=[self.state_key], args=[now.timestamp(), WARNING_PAUSE_SECONDS, MAX_WARNINGS, self._ttl]
+        )
+
+    # --- answers ---
+
+    def start_answers(self, now):
+        with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hsetnx(self.state_key, "start_time", now.isoformat())
+            pipe.expire(self.state_key, self._ttl)
+            pipe.execute()
+
+    def answers_started(self) -> bool:
+        return bool(self._redis.hexists(self.state_key, "start_time"))
+
+    def answers(self) -> list:
+        entries = [json.loads(v) for v in self._redis.hvals(self.answers_key)]
+        return sorted(entries, key=lambda q: q["question_id"])
+
+    def get_answer(self, question_id: int):
+        value = self._redis.hget(self.answers_key, str(question_id))
+        return json.loads(value) if value is not None else None
+
+    def update_answer(self, question_id: int, update):
+        """Same contract as CandidateSession.update_answer, as a WATCH/MULTI transaction."""
+        field = str(question_id)
+        with self._redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    pipe.watch(self.answers_key)
+                    value = pipe.hget(self.answers_key, field)
+                    entry = update(json.loads(value) if value is not None else None)
+                    if entry is None:
+                        pipe.unwatch()
+                        return None
+                    pipe.multi()
+                    pipe.hset(self.answers_key, field, json.dumps(entry, default=str))
+                    pipe.expire(self.answers_key, self._ttl)
+                    pipe.execute()
+                    return entry
+                except redis.WatchError:
+                    continue  # another worker changed the sheet; re-read and retry
+
+    def put_answer(self, entry: dict):
+        with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self.answers_key, str(entry["question_id"]), json.dumps(entry, default=str))
+            pipe.expire(self.answers_key, self._ttl)
+            pipe.execute()
+
+    def add_score(self, delta: int) -> int:
+        with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hincrby(self.state_key, "score", delta)
+            pipe.expire(self.state_key, self._ttl)
+            score, _ = pipe.execute()
+        return score
+
+
+class RedisSessionRegistry:
+    """Registry facade over Redis; handles are free to create, keys expire on their own."""
+
+    blocking = True  # every call is a round-trip; async handlers use run_session
+
+    def __init__(self, url: str = REDIS_URL, idle_ttl: float = CANDIDATE_SESSION_IDLE_TTL):
+        self.url = url
+        self.idle_ttl = idle_ttl
+        # Connection-pooled and thread-safe; shared by every request thread
+        self.client = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2)
+        self.add_pose = self.client.register_script(ADD_POSE)
+        self.sustained_violation = self.client.register_script(SUSTAINED_VIOLATION)
+        self.record_violation = self.client.register_script(RECORD_VIOLATION)
+
+    def get(self, candidate_id: str, create: bool = True) -> RedisCandidateSession:
+        session = RedisCandidateSession(self, candidate_id)
+        if not create and not self.client.exists(session.state_key, session.pose_key, session.answers_key):
+            return None
+        return session
+
+    def discard(self, candidate_id: str):
+        session = RedisCandidateSession(self, candidate_id)
+        self.client.delete(session.state_key, session.pose_key, session.answers_key)
+
+    def stats(self) -> dict:
+        stats = {"backend": "redis", "idle_ttl_s": self.idle_ttl}
+        try:
+            memory = self.client.info("memory")
+            stats["memory_bytes"] = memory.get("used_memory")
+            stats["keys"] = self.client.dbsize()
+        except redis.RedisError as e:
+            stats["error"] = str(e)
+        return stats
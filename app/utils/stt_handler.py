@@ -28,62 +28,201 @@
 #     except Exception as e:
 #         raise ValueError(f"Speech-to-text failed: {str(e)}")
 
-from faster_whisper import WhisperModel
-import tempfile
+from faster_whisper import WhisperModel, decode_audio
+from fastapi import HTTPException
+from collections import OrderedDict
+import asyncio
+import hashlib
+import io
 import os
-from pydub import AudioSegment
-import torch
+import threading
+import ctranslate2
+import numpy as np
 from datetime import datetime
-from app.db.session import db
+from app.db import repositories
+from app.utils.model_registry import models
+from app.utils.stt_jobs import SttJobQueue, SttQueueFull
+
+# Transcription worker budget (override via environment)
+STT_WORKERS = int(os.getenv("STT_WORKERS", "2"))
+STT_CPU_THREADS = int(os.getenv("STT_CPU_THREADS", "2"))  # per transcription
+STT_MAX_QUEUE = int(os.getenv("STT_MAX_QUEUE", "64"))
+STT_CACHE_SIZE = int(os.getenv("STT_CACHE_SIZE", "256"))  # transcripts kept by audio hash
+STT_MAX_UPLOAD_BYTES = int(os.getenv("STT_MAX_UPLOAD_BYTES", str(25 * 1024 * 1024)))
 
 model_size = "tiny"
-model = WhisperModel(model_size, compute_type="float16" if torch.cuda.is_available() else "int8")
+SAMPLE_RATE = 16000  # what Whisper expects
+
+# Everything besides the audio bytes that changes the transcript; part of the cache key
+TRANSCRIBE_OPTIONS = {
+    "beam_size": 5,
+    "language": "en",
+    "vad_filter": True,  # helps with short/quiet clips
+    "vad_parameters": {"min_silence_duration_ms": 150}
+}
+TRANSCRIPT_KEY_PARAMS = repr((model_size, SAMPLE_RATE, sorted(TRANSCRIBE_OPTIONS.items()))).encode("utf-8")
+
+
+def _load_whisper():
+    # CTranslate2 reports the GPUs it can use itself; no need to import torch for that
+    return WhisperModel(
+        model_size,
+        compute_type="float16" if ctranslate2.get_cuda_device_count() > 0 else "int8",
+        cpu_threads=STT_CPU_THREADS,
+        num_workers=STT_WORKERS  # lets STT_WORKERS threads transcribe concurrently
+    )
+
+
+def _warm_up_whisper(model):
+    # One second of silence; VAD finds no speech, so transcribe without it
+    segments, _ = model.transcribe(np.zeros(SAMPLE_RATE, dtype=np.float32), beam_size=1, language="en")
+    list(segments)  # segments are generated lazily
+
+
+models.register("whisper", _load_whisper, _warm_up_whisper)
+
+
+def decode_audio_bytes(content: bytes):
+    """
+    Decode an uploaded clip (webm/opus, wav, ...) in memory with PyAV straight
+    into a mono 16 kHz float32 NumPy array: no temp files, no ffmpeg subprocess.
+    """
+    return decode_audio(io.BytesIO(content), sampling_rate=SAMPLE_RATE)
+
+
+def transcribe_bytes(content: bytes) -> str:
+    """Blocking decode + transcription; runs on the STT worker threads."""
+    audio = decode_audio_bytes(content)
+    segments, _ = models.get("whisper").transcribe(audio, **TRANSCRIBE_OPTIONS)
+
+    # Segments are generated lazily; joining them is where decoding happens
+    texts = [seg.text.strip() for seg in segments if getattr(seg, "text", None)]
+    return " ".join(texts).strip()
+
+
+stt_queue = SttJobQueue(transcribe_bytes, workers=STT_WORKERS, max_queue=STT_MAX_QUEUE)
+
+
+async def read_audio_upload(upload, max_bytes: int = STT_MAX_UPLOAD_BYTES) -> bytes:
+    """Read an uploaded clip, aborting with 413 as soon as it exceeds max_bytes."""
+    buffer = bytearray()
+    while chunk := await upload.read(256 * 1024):
+        buffer.extend(chunk)
+        if len(buffer) > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Audio too large (max {max_bytes / 1024 / 1024:.0f}MB)")
+    return bytes(buffer)
+
+
+def transcript_key(content: bytes) -> str:
+    digest = hashlib.sha256(content)
+    digest.update(TRANSCRIPT_KEY_PARAMS)
+    return digest.hexdigest()
+
+
+class TranscriptCache:
+    """
+    Bounded LRU of transcripts keyed on a SHA-256 of the audio bytes plus the
+    decode/transcribe parameters. Identical uploads (stt_only followed by
+    submit_answer, client retries) share one Whisper pass; concurrent
+    duplicates wait on the transcription already in flight.
+    """
+
+    def __init__(self, max_size: int = STT_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()  # key -> {"text": str, "logged": set of (candidate_id, question_id)}
+        self._inflight = {}  # key -> concurrent future of the running job
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, text: str):
+        with self._lock:
+            entry = self._entries.setdefault(key, {"text": text, "logged": set()})
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            return entry
+
+    async def transcribe(self, content: bytes, candidate_id=None, question_id=None):
+        """Transcript for ``content`` and its cache entry, running Whisper only on a miss."""
+        key = transcript_key(content)
+        with self._lock:
+            entry = self._entries.get(key)
+            future = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+            else:
+                future = self._inflight.get(key)
+            # Counted under the lock: concurrent threadpool callers would lose increments
+            if entry is not None or future is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if entry is not None:
+            return entry
+        if future is not None:
+            text = await asyncio.wrap_future(future)
+            return self.get(key) or self.put(key, text)
+
+        job = stt_queue.submit(content, candidate_id, question_id)
+        with self._lock:
+            self._inflight[key] = job.future
+        try:
+            text = await asyncio.wrap_future(job.future)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        return self.put(key, text)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_size": self.max_size,
+            "in_flight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+transcripts = TranscriptCache()
+
 
 async def speech_to_text(audio_file, candidate_id: str, question_id: int, expected_answer: str):
     try:
-        # Save webm to temp
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as tmp_webm:
-            webm_path = tmp_webm.name
-            content = await audio_file.read()
-            tmp_webm.write(content)
-
-        # Convert webm → wav
-        audio = AudioSegment.from_file(webm_path, format="webm")
-        wav_path = webm_path.replace(".webm", ".wav")
-        audio.export(wav_path, format="wav")
-        os.remove(webm_path)
-
-        # Transcribe
-        segments, _ = model.transcribe(
-            wav_path,
-            beam_size=5,
-            language="en",
-            vad_filter=True,  # helps with short/quiet clips
-            vad_parameters={"min_silence_duration_ms": 150}
-        )
-        os.remove(wav_path)
-
-        # Merge segments
-        texts = [seg.text.strip() for seg in segments if getattr(seg, "text", None)]
-        transcription = " ".join(texts).strip()
+        content = await read_audio_upload(audio_file)
+        entry = await transcripts.transcribe(content, candidate_id, question_id)
+        transcription = entry["text"]
+
+        # The same clip was already logged for this question (e.g. by stt_only)
+        logged_key = (candidate_id, question_id)
+        if logged_key in entry["logged"]:
+            return transcription
+        # Claimed before the push so a concurrent duplicate does not log twice
+        entry["logged"].add(logged_key)
 
         # Store in MongoDB
-        db["qa_logs"].update_one(
-            {"candidate_id": candidate_id},
-            {
-                "$push": {
-                    "qa_log": {
-                        "question_id": question_id,
-                        "expected_answer": expected_answer,
-                        "user_answer": transcription,
-                        "timestamp": datetime.utcnow()
-                    }
-                }
-            },
-            upsert=True
-        )
+        try:
+            await repositories.push_qa_entry(candidate_id, {
+                "question_id": question_id,
+                "expected_answer": expected_answer,
+                "user_answer": transcription,
+                "timestamp": datetime.utcnow()
+            })
+        except BaseException:
+            # Not logged after all; a retry with the same clip must push again
+            entry["logged"].discard(logged_key)
+            raise
 
         return transcription
 
+    except (SttQueueFull, HTTPException):
+        raise
     except Exception as e:
         raise ValueError(f"Speech-to-text failed: {str(e)}")
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class SttQueueFull(RuntimeError):
+    """Raised when the transcription backlog is at its limit."""
+
+
+class SttJob:
+    def __init__(self, candidate_id=None, question_id=None):
+        self.job_id = uuid.uuid4().hex
+        self.candidate_id = candidate_id
+        self.question_id = question_id
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.enqueued_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+
+    def to_dict(self) -> dict:
+        data = {"job_id": self.job_id, "status": self.status}
+        if self.status == "done":
+            data["user_answer"] = self.result
+        elif self.status == "failed":
+            data["error"] = self.error
+        if self.started_at is not None:
+            data["wait_ms"] = round((self.started_at - self.enqueued_at) * 1000, 1)
+        if self.finished_at is not None:
+            data["run_ms"] = round((self.finished_at - self.started_at) * 1000, 1)
+        return data
+
+
+class SttJobQueue:
+    """
+    Bounded transcription backlog served by a fixed pool of worker threads.
+    faster-whisper releases the GIL while decoding, so a few threads keep
+    several transcriptions in flight without touching the event loop.
+    Finished jobs are kept for result_ttl seconds so clients can poll them.
+    """
+
+    def __init__(self, transcribe, workers: int, max_queue: int, result_ttl: float = 600):
+        self.transcribe = transcribe
+        self.workers = workers
+        self.max_queue = max_queue
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stt")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._total_run = 0.0
+
+    def submit(self, content: bytes, candidate_id=None, question_id=None, transcribe=None) -> SttJob:
+        """
+        Queue ``transcribe(content)`` (the queue's default function unless
+        overridden, e.g. for incremental stream chunks) on the worker pool.
+        """
+        job = SttJob(candidate_id, question_id)
+        with self._lock:
+            self._prune()
+            if self._pending >= self.max_queue:
+                self._rejected += 1
+                raise SttQueueFull(f"Transcription queue is full ({self.max_queue} jobs)")
+            self._pending += 1
+            self._jobs[job.job_id] = job
+        job.future = self._executor.submit(self._run, job, content, transcribe or self.transcribe)
+        return job
+
+    async def run(self, content: bytes, candidate_id=None, question_id=None, transcribe=None) -> str:
+        """Enqueue a transcription and await its text without blocking the event loop."""
+        job = self.submit(content, candidate_id, question_id, transcribe)
+        return await asyncio.wrap_future(job.future)
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job: SttJob, content: bytes, transcribe) -> str:
+        job.started_at = time.monotonic()
+        job.status = "running"
+        wait = job.started_at - job.enqueued_at
+        with self._lock:
+            self._pending -= 1
+            self._running += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+        try:
+            job.result = transcribe(content)
+            job.status = "done"
+            return job.result
+        except Exception as e:
+            logger.error(f"STT job {job.job_id} failed: {str(e)}")
+            job.error = str(e)
+            job.status = "failed"
+            raise
+        finally:
+            job.finished_at = time.monotonic()
+            with self._lock:
+                self._running -= 1
+                if job.status == "done":
+                    self._completed += 1
+                else:
+                    self._failed += 1
+                self._total_run += job.finished_at - job.started_at
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.result_ttl
+        expired = [jid for jid, j in self._jobs.items() if j.finished_at is not None and j.finished_at < cutoff]
+        for jid in expired:
+            del self._jobs[jid]
+
+    def stats(self) -> dict:
+        with self._lock:
+            started = self._completed + self._failed + self._running
+            finished = self._completed + self._failed
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "queued": self._pending,
+                "running": self._running,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "avg_wait_ms": round(self._total_wait / started * 1000, 1) if started else 0,
+                "max_wait_ms": round(self._max_wait * 1000, 1),
+                "avg_run_ms": round(self._total_run / finished * 1000, 1) if finished else 0
+            }
@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+
+from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+from app.utils.model_registry import models
+from app.utils.stt_handler import SAMPLE_RATE, TRANSCRIBE_OPTIONS, decode_audio_bytes, stt_queue
+
+logger = logging.getLogger(__name__)
+
+# Chunked answer uploads (override via environment)
+STT_STREAM_IDLE_TTL = float(os.getenv("STT_STREAM_IDLE_TTL", "300"))  # seconds
+STT_STREAM_MAX_BYTES = int(os.getenv("STT_STREAM_MAX_BYTES", str(25 * 1024 * 1024)))
+STT_STREAM_TAIL_SILENCE_MS = int(os.getenv("STT_STREAM_TAIL_SILENCE_MS", "500"))
+
+# Same VAD settings transcribe_bytes passes to Whisper, so segment boundaries match
+VAD_OPTIONS = VadOptions(**TRANSCRIBE_OPTIONS["vad_parameters"])
+PROMPT_CHARS = 200  # committed text fed back as context for the next segment
+
+
+class StreamClosed(ValueError):
+    """Raised when a chunk arrives for a stream that is finished or too large."""
+
+
+class ChunkOutOfOrder(ValueError):
+    """Raised when a chunk's sequence number is not the next one the stream expects."""
+
+
+class TranscriptionStream:
+    """
+    One candidate answer uploaded as a sequence of chunks of a single
+    recording (e.g. MediaRecorder timeslices of one webm file).
+
+    Every chunk re-decodes the accumulated bytes, which is cheap next to
+    Whisper, and runs VAD over the audio that is not yet committed. Speech
+    segments followed by enough silence cannot change any more, so they are
+    transcribed and committed right away; at finish only the trailing,
+    still-open segment is left to transcribe.
+
+    Chunks are numbered from 0 and dispatched one at a time per stream (see
+    append_chunk), so they can never be appended out of order even though
+    any STT worker thread may run them.
+    """
+
+    def __init__(self, candidate_id: str, question_id: int):
+        self.stream_id = uuid.uuid4().hex
+        self.candidate_id = candidate_id
+        self.question_id = question_id
+        self.buffer = bytearray()
+        self.committed_samples = 0
+        self.texts = []
+        self.finished = False
+        self.next_seq = 0
+        self.lock = threading.Lock()
+        self.order_lock = asyncio.Lock()  # held from dispatch to completion of each chunk
+        self.last_used = time.monotonic()
+
+    @property
+    def transcript(self) -> str:
+        return " ".join(self.texts).strip()
+
+    @property
+    def committed_seconds(self) -> float:
+        return round(self.committed_samples / SAMPLE_RATE, 2)
+
+    def _transcribe(self, audio) -> str:
+        segments, _ = models.get("whisper").transcribe(
+            audio,
+            **TRANSCRIBE_OPTIONS,
+            initial_prompt=self.transcript[-PROMPT_CHARS:] or None
+        )
+        return " ".join(seg.text.strip() for seg in segments if getattr(seg, "text", None)).strip()
+
+    def _commit(self, audio):
+        if len(audio):
+            text = self._transcribe(audio)
+            if text:
+                self.texts.append(text)
+        self.committed_samples += len(audio)
+
+    def ingest(self, chunk: bytes) -> str:
+        """Blocking; runs on the STT worker threads. Returns the transcript so far."""
+        with self.lock:
+            if self.finished:
+                raise StreamClosed("Stream already finished")
+            if len(self.buffer) + len(chunk) > STT_STREAM_MAX_BYTES:
+                raise StreamClosed(f"Stream exceeds {STT_STREAM_MAX_BYTES} bytes")
+            size, committed, texts = len(self.buffer), self.committed_samples, len(self.texts)
+            self.buffer.extend(chunk)
+
+            try:
+                # A truncated last frame is skipped by the decoder and picked up next time
+                pending = decode_audio_bytes(bytes(self.buffer))[self.committed_samples:]
+                speech = get_speech_timestamps(pending, VAD_OPTIONS)
+
+                min_tail = STT_STREAM_TAIL_SILENCE_MS * SAMPLE_RATE // 1000
+                cut = 0
+                for i, segment in enumerate(speech):
+                    next_start = speech[i + 1]["start"] if i + 1 < len(speech) else len(pending)
+                    if next_start - segment["end"] < min_tail:
+                        break
+                    # Cut in the middle of the pause so neither side loses a word edge
+                    cut = (segment["end"] + next_start) // 2
+                if cut:
+                    self._commit(pending[:cut])
+            except Exception:
+                # Undo the whole chunk (decode, VAD or Whisper failed): the client resends it
+                del self.buffer[size:]
+                self.committed_samples = committed
+                del self.texts[texts:]
+                raise
+            return self.transcript
+
+    def finish(self, chunk: bytes = b"") -> str:
+        """Blocking; transcribes whatever is left after the last committed segment."""
+        with self.lock:
+            if self.finished:
+                return self.transcript
+            if len(self.buffer) + len(chunk) > STT_STREAM_MAX_BYTES:
+                raise StreamClosed(f"Stream exceeds {STT_STREAM_MAX_BYTES} bytes")
+            size, texts = len(self.buffer), len(self.texts)
+            self.buffer.extend(chunk)
+            try:
+                if self.buffer:
+                    self._commit(decode_audio_bytes(bytes(self.buffer))[self.committed_samples:])
+            except Exception:
+                # As in ingest: a retried finish must not see this chunk twice
+                del self.buffer[size:]
+                del self.texts[texts:]
+                raise
+            self.finished = True
+            self.buffer = bytearray()
+            return self.transcript
+
+
+class TranscriptionStreamRegistry:
+    """Open answer streams, dropped after STT_STREAM_IDLE_TTL seconds without a chunk."""
+
+    def __init__(self, idle_ttl: float = STT_STREAM_IDLE_TTL):
+        self.idle_ttl = idle_ttl
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def open(self, candidate_id: str, question_id: int) -> TranscriptionStream:
+        stream = TranscriptionStream(candidate_id, question_id)
+        with self._lock:
+            self._evict_idle()
+            self._streams[stream.stream_id] = stream
+        return stream
+
+    def get(self, stream_id: str):
+        with self._lock:
+            stream = self._streams.get(stream_id)
+            if stream is not None:
+                stream.last_used = time.monotonic()
+            return stream
+
+    def close(self, stream_id: str):
+        with self._lock:
+            return self._streams.pop(stream_id, None)
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.idle_ttl
+        for stream_id in [sid for sid, s in self._streams.items() if s.last_used < cutoff]:
+            logger.info(f"Dropping idle transcription stream {stream_id}")
+            del self._streams[stream_id]
+
+    def __len__(self):
+        return len(self._streams)
+
+
+transcription_streams = TranscriptionStreamRegistry()
+
+
+async def append_chunk(stream: TranscriptionStream, chunk: bytes, seq: int = None) -> str:
+    """
+    Queue a chunk on the shared STT workers and await the partial transcript.
+    ``seq`` must be the stream's next chunk number when given; a failed chunk
+    does not advance it, so the client can resend it.
+    """
+    async with stream.order_lock:
+        if seq is not None and seq != stream.next_seq:
+            raise ChunkOutOfOrder(f"Expected chunk {stream.next_seq}, got {seq}")
+        partial = await stt_queue.run(chunk, stream.candidate_id, stream.question_id, transcribe=stream.ingest)
+        stream.next_seq += 1
+        return partial
+
+
+async def finish_stream(stream: TranscriptionStream, chunk: bytes = b"") -> str:
+    # Runs after any chunk still being transcribed
+    async with stream.order_lock:
+        transcript = await stt_queue.run(chunk, stream.candidate_id, stream.question_id, transcribe=stream.finish)
+    transcription_streams.close(stream.stream_id)
+    return transcript
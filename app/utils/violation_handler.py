@@ -1,8 +1,9 @@
 # app/utils/violation_handler.py
 
 from datetime import datetime
+from pymongo import UpdateOne
 from pymongo.errors import PyMongoError
-from app.db.session import db
+from app.db.event_sink import event_sink
 from app.utils.logger import log_cheating_to_mongo
 import logging
 
@@ -14,7 +15,8 @@ def disqualify_candidate(candidate_id: str, reason: str, extra_data: dict = None
     Returns True if successful, False otherwise.
     """
     try:
-        db["result"].update_one(
+        # The ban must be stored before the client is told, so bypass the buffer
+        event_sink.write_now("result", UpdateOne(
             {"candidate_id": candidate_id},
             {
                 "$set": {
@@ -26,7 +28,7 @@ def disqualify_candidate(candidate_id: str, reason: str, extra_data: dict = None
                 }
             },
             upsert=True
-        )
+        ))
 
         log_cheating_to_mongo(
             candidate_id=candidate_id,
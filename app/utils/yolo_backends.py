@@ -0,0 +1,365 @@
+"""
+Inference backends for the YOLO detector, selected with YOLO_BACKEND:
+
+    torch        ultralytics + PyTorch eager mode (yolov8n.pt)
+    onnxruntime  an exported ONNX model (fp32 or int8) on ONNX Runtime's CPU provider
+    openvino     an exported OpenVINO IR model (fp32 or int8) on the OpenVINO CPU plugin
+
+Every backend returns plain-NumPy Detections, so summarize_detections and the
+rest of the frames pipeline do not depend on which one ran. Export the models
+and check them against PyTorch before switching:
+
+    python -m app.utils.yolo_backends export --format onnx
+    python -m app.utils.yolo_backends export --format onnx --int8 --calibration path/to/frames/
+    python -m app.utils.yolo_backends export --format openvino --int8
+    python -m app.utils.yolo_backends parity --backend onnxruntime path/to/frames/*.jpg
+"""
+import argparse
+import ast
+import glob
+import logging
+import os
+import sys
+import threading
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Backend selection (override via environment)
+YOLO_BACKEND = os.getenv("YOLO_BACKEND", "torch")
+YOLO_WEIGHTS = os.getenv("YOLO_WEIGHTS", "yolov8n.pt")
+YOLO_CPU_THREADS = int(os.getenv("YOLO_CPU_THREADS", "0"))  # 0 = the runtime's default
+
+DEFAULT_MODEL_PATHS = {
+    "torch": YOLO_WEIGHTS,
+    "onnxruntime": "yolov8n.onnx",
+    "openvino": "yolov8n_openvino_model"
+}
+
+# ultralytics predict() defaults, so exported backends filter the same way
+CONF_THRESHOLD = 0.25
+IOU_THRESHOLD = 0.7
+MAX_DET = 300
+PAD_VALUE = 114
+
+# Raw detections of one image in original-image pixels: cls int64 (K,),
+# conf float32 (K,), xyxy float32 (K, 4)
+Detections = namedtuple("Detections", ["cls", "conf", "xyxy"])
+
+
+def letterbox(img: np.ndarray, size: int):
+    """Resize keeping aspect ratio and pad to size x size; returns (image, gain, (pad_x, pad_y))."""
+    h, w = img.shape[:2]
+    gain = min(size / h, size / w)
+    new_w, new_h = int(round(w * gain)), int(round(h * gain))
+    if (new_w, new_h) != (w, h):
+        img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    pad_x, pad_y = (size - new_w) / 2, (size - new_h) / 2
+    top, bottom = int(round(pad_y - 0.1)), int(round(pad_y + 0.1))
+    left, right = int(round(pad_x - 0.1)), int(round(pad_x + 0.1))
+    img = cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(PAD_VALUE,) * 3)
+    return img, gain, (left, top)
+
+
+def to_input(img: np.ndarray) -> np.ndarray:
+    """Letterboxed BGR uint8 HWC -> RGB float32 CHW in [0, 1]."""
+    return np.ascontiguousarray(img[:, :, ::-1].transpose(2, 0, 1), dtype=np.float32) / 255.0
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """Greedy non-maximum suppression; returns kept indices, best score first."""
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        x1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        y1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        x2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        y2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-7)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+def postprocess(output: np.ndarray, gain: float, pad, shape) -> Detections:
+    """
+    Decode one image's raw YOLOv8 head output (4 + num_classes, num_anchors):
+    confidence filter, per-class NMS and mapping back to original pixels.
+    """
+    pred = output.T
+    scores = pred[:, 4:]
+    cls = scores.argmax(axis=1)
+    conf = scores[np.arange(len(cls)), cls]
+    mask = conf >= CONF_THRESHOLD
+    pred, cls, conf = pred[mask], cls[mask], conf[mask]
+    if not len(conf):
+        return Detections(np.zeros(0, np.int64), np.zeros(0, np.float32), np.zeros((0, 4), np.float32))
+
+    xy, wh = pred[:, :2], pred[:, 2:4]
+    xyxy = np.concatenate([xy - wh / 2, xy + wh / 2], axis=1)
+    # Offset boxes by class so one NMS pass never suppresses across classes
+    keep = nms(xyxy + cls[:, None] * 4096.0, conf, IOU_THRESHOLD)[:MAX_DET]
+    xyxy, cls, conf = xyxy[keep], cls[keep], conf[keep]
+
+    xyxy = (xyxy - np.array([pad[0], pad[1], pad[0], pad[1]], dtype=xyxy.dtype)) / gain
+    h, w = shape[:2]
+    xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, w)
+    xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, h)
+    return Detections(cls.astype(np.int64), conf.astype(np.float32), xyxy.astype(np.float32))
+
+
+class TorchBackend:
+    """ultralytics YOLO in PyTorch; the reference the exported backends are checked against."""
+
+    name = "torch"
+
+    def __init__(self, path: str, imgsz: int):
+        # Imported here: ultralytics pulls in torch, which dominates import time
+        from ultralytics import YOLO
+        self.imgsz = imgsz
+        self.model = YOLO(path)
+        self.names = self.model.names
+
+    def predict(self, images: list) -> list:
+        results = self.model.predict(images, imgsz=self.imgsz, verbose=False)
+        return [
+            Detections(
+                r.boxes.cls.cpu().numpy().astype(np.int64),
+                r.boxes.conf.cpu().numpy().astype(np.float32),
+                r.boxes.xyxy.cpu().numpy().astype(np.float32)
+            )
+            for r in results
+        ]
+
+
+class _ExportedBackend:
+    """Letterbox, run the exported graph, decode; subclasses only run the graph."""
+
+    imgsz = None
+    fixed_batch = False
+
+    def _infer(self, batch: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def predict(self, images: list) -> list:
+        prepared = [letterbox(img, self.imgsz) for img in images]
+        inputs = [to_input(letterboxed) for letterboxed, _, _ in prepared]
+        if self.fixed_batch:
+            outputs = [self._infer(x[None])[0] for x in inputs]
+        else:
+            outputs = self._infer(np.stack(inputs))
+        return [
+            postprocess(output, gain, pad, img.shape)
+            for output, img, (_, gain, pad) in zip(outputs, images, prepared)
+        ]
+
+
+class OnnxRuntimeBackend(_ExportedBackend):
+    name = "onnxruntime"
+
+    def __init__(self, path: str, imgsz: int, threads: int = YOLO_CPU_THREADS):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        batch, _, height, _ = self.session.get_inputs()[0].shape
+        self.fixed_batch = isinstance(batch, int)
+        self.imgsz = height if isinstance(height, int) else imgsz
+        # ultralytics stores the class map in the ONNX metadata
+        self.names = ast.literal_eval(self.session.get_modelmeta().custom_metadata_map["names"])
+
+    def _infer(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class OpenVinoBackend(_ExportedBackend):
+    name = "openvino"
+
+    def __init__(self, path: str, imgsz: int, threads: int = YOLO_CPU_THREADS):
+        import openvino as ov
+        import yaml
+        xml_path = path if path.endswith(".xml") else glob.glob(os.path.join(path, "*.xml"))[0]
+        core = ov.Core()
+        model = core.read_model(xml_path)
+        config = {"PERFORMANCE_HINT": "LATENCY"}
+        if threads > 0:
+            config["INFERENCE_NUM_THREADS"] = threads
+        self.compiled = core.compile_model(model, "CPU", config)
+        shape = model.input(0).get_partial_shape()
+        self.fixed_batch = shape[0].is_static
+        self.imgsz = shape[2].get_length() if shape[2].is_static else imgsz
+        self._output = self.compiled.output(0)
+        self._lock = threading.Lock()  # the compiled model's implicit infer request is not thread-safe
+        # ultralytics writes the class map next to the IR
+        with open(os.path.join(os.path.dirname(xml_path), "metadata.yaml"), encoding="utf-8") as f:
+            self.names = yaml.safe_load(f)["names"]
+
+    def _infer(self, batch: np.ndarray) -> np.ndarray:
+        with self._lock:
+            return self.compiled([batch])[self._output]
+
+
+BACKENDS = {
+    "torch": TorchBackend,
+    "onnxruntime": OnnxRuntimeBackend,
+    "openvino": OpenVinoBackend
+}
+
+
+def create_backend(name: str = YOLO_BACKEND, path: str = None, imgsz: int = 320):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown YOLO_BACKEND {name!r} (expected one of {', '.join(BACKENDS)})")
+    path = path or os.getenv("YOLO_MODEL_PATH") or DEFAULT_MODEL_PATHS[name]
+    logger.info(f"Loading YOLO backend {name} from {path}")
+    return BACKENDS[name](path, imgsz)
+
+
+# --- offline tooling ---
+
+def _read_images(paths: list) -> list:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.jpg")) + glob.glob(os.path.join(path, "*.png"))))
+        else:
+            files.append(path)
+    return files
+
+
+def _quantize_onnx(fp32_path: str, calibration: list, imgsz: int) -> str:
+    """Static int8 (QDQ) quantization calibrated on real frames; keeps the class-map metadata."""
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    class FrameReader(CalibrationDataReader):
+        def __init__(self):
+            self.input_name = onnx.load(fp32_path).graph.input[0].name
+            self.files = iter(calibration)
+
+        def get_next(self):
+            path = next(self.files, None)
+            if path is None:
+                return None
+            letterboxed, _, _ = letterbox(cv2.imread(path), imgsz)
+            return {self.input_name: to_input(letterboxed)[None]}
+
+    int8_path = fp32_path.replace(".onnx", "-int8.onnx")
+    quantize_static(
+        fp32_path, int8_path, FrameReader(),
+        quant_format=QuantFormat.QDQ, per_channel=True,
+        weight_type=QuantType.QInt8, activation_type=QuantType.QUInt8
+    )
+    fp32_model, int8_model = onnx.load(fp32_path), onnx.load(int8_path)
+    onnx.helper.set_model_props(int8_model, {p.key: p.value for p in fp32_model.metadata_props})
+    onnx.save(int8_model, int8_path)
+    return int8_path
+
+
+def export(fmt: str, int8: bool = False, calibration: list = None, data: str = None, imgsz: int = 320) -> str:
+    from ultralytics import YOLO
+    model = YOLO(YOLO_WEIGHTS)
+    if fmt == "onnx":
+        path = model.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+        if int8:
+            if not calibration:
+                raise ValueError("--int8 for onnx needs --calibration frames")
+            path = _quantize_onnx(path, _read_images(calibration), imgsz)
+        return path
+    if fmt == "openvino":
+        # OpenVINO int8 goes through NNCF, calibrated on an ultralytics dataset yaml
+        options = {"data": data} if data else {}
+        return model.export(format="openvino", imgsz=imgsz, int8=int8, **options)
+    raise ValueError(f"Unknown export format {fmt!r}")
+
+
+def _max_box_shift(a: np.ndarray, b: np.ndarray) -> float:
+    """Largest corner shift between each box in a and its nearest box in b."""
+    if not len(a) or not len(b):
+        return 0.0 if len(a) == len(b) else float("inf")
+    return float(np.abs(a[:, None, :] - b[None, :, :]).max(axis=2).min(axis=1).max())
+
+
+def parity(backend: str, images: list, path: str = None, imgsz: int = 320,
+           conf_tol: float = 0.05, box_tol: float = 8.0) -> bool:
+    """
+    Run every image through PyTorch and the given backend and compare the
+    DetectionSummary the frames pipeline acts on: phone flag and person count
+    must match exactly, max confidences within conf_tol, kept boxes within
+    box_tol pixels. Prints per-image results and mean latency of both.
+    """
+    from app.utils.yolo_handler import MOBILE_CLASSES, PERSON_CLASS, resolve_class_ids, summarize_detections
+
+    reference = create_backend("torch", path=YOLO_WEIGHTS, imgsz=imgsz)
+    candidate = create_backend(backend, path=path, imgsz=imgsz)
+    ids = (resolve_class_ids(reference.names, MOBILE_CLASSES), resolve_class_ids(reference.names, {PERSON_CLASS}))
+
+    ok = True
+    timings = {reference.name: [], candidate.name: []}
+    for file in _read_images(images):
+        img = cv2.imread(file)
+        if img is None:
+            print(f"skip {file}: not an image")
+            continue
+        summaries = []
+        for runner in (reference, candidate):
+            runner.predict([img])  # warm caches so the timing is steady-state
+            started = time.perf_counter()
+            detections = runner.predict([img])[0]
+            timings[runner.name].append(time.perf_counter() - started)
+            summaries.append(summarize_detections(detections, class_ids=ids))
+        ref, got = summaries
+
+        problems = []
+        if (ref.phone_detected, ref.person_count) != (got.phone_detected, got.person_count):
+            problems.append(f"phone/persons {ref.phone_detected}/{ref.person_count} vs {got.phone_detected}/{got.person_count}")
+        for field in ("max_phone_conf", "max_person_conf"):
+            if abs(getattr(ref, field) - getattr(got, field)) > conf_tol:
+                problems.append(f"{field} {getattr(ref, field):.3f} vs {getattr(got, field):.3f}")
+        for field in ("phone_boxes", "person_boxes"):
+            shift = _max_box_shift(getattr(ref, field), getattr(got, field))
+            if shift > box_tol:
+                problems.append(f"{field} shifted {shift:.1f}px")
+        ok = ok and not problems
+        print(f"{'FAIL' if problems else 'ok  '} {file}" + (f": {'; '.join(problems)}" if problems else ""))
+
+    for name, values in timings.items():
+        if values:
+            print(f"{name}: {np.mean(values) * 1000:.1f} ms/frame over {len(values)} frame(s)")
+    return ok
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(prog="python -m app.utils.yolo_backends")
+    parser.add_argument("--imgsz", type=int, default=320)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_cmd = commands.add_parser("export", help="export yolov8n for a CPU backend")
+    export_cmd.add_argument("--format", choices=["onnx", "openvino"], required=True)
+    export_cmd.add_argument("--int8", action="store_true")
+    export_cmd.add_argument("--calibration", nargs="+", help="frames (files or directories) for onnx int8")
+    export_cmd.add_argument("--data", help="ultralytics dataset yaml for openvino int8 calibration")
+
+    parity_cmd = commands.add_parser("parity", help="compare a backend's detections with PyTorch")
+    parity_cmd.add_argument("--backend", choices=["onnxruntime", "openvino"], required=True)
+    parity_cmd.add_argument("--model", help="exported model path (default: YOLO_MODEL_PATH or the export name)")
+    parity_cmd.add_argument("--conf-tol", type=float, default=0.05)
+    parity_cmd.add_argument("--box-tol", type=float, default=8.0)
+    parity_cmd.add_argument("images", nargs="+", help="frames (files or directories)")
+
+    args = parser.parse_args()
+    if args.command == "export":
+        print(export(args.format, args.int8, args.calibration, args.data, args.imgsz))
+    else:
+        sys.exit(0 if parity(args.backend, args.images, args.model, args.imgsz, args.conf_tol, args.box_tol) else 1)
@@ -1,34 +1,209 @@
-from ultralytics import YOLO
 import numpy as np
+import os
+import time
+import queue
+import threading
+import logging
+from collections import namedtuple
+from concurrent.futures import Future
+from functools import lru_cache
 
-# Load YOLO model globally once
-model = YOLO("yolov8n.pt")  # YOLOv8 nano
+from app.utils.model_registry import models
+from app.utils.yolo_backends import Detections, create_backend
+
+logger = logging.getLogger(__name__)
 
 # YOLOv8 COCO classes to watch
 MOBILE_CLASSES = {"cell phone", "phone", "cellphone", "mobile phone"}
 PERSON_CLASS = "person"
 
-def get_yolo_results(image: np.ndarray):
+YOLO_IMGSZ = 320
+
+# Micro-batching (override via environment); YOLO_BATCH_MAX <= 1 disables batching
+YOLO_BATCH_MAX = int(os.getenv("YOLO_BATCH_MAX", "16"))
+YOLO_BATCH_WAIT_MS = float(os.getenv("YOLO_BATCH_WAIT_MS", "5"))
+# Upper bound on waiting for a batched result; covers a first-use model load
+YOLO_RESULT_TIMEOUT = float(os.getenv("YOLO_RESULT_TIMEOUT", "30"))
+
+
+def _load_yolo():
+    # YOLOv8 nano on YOLO_BACKEND (torch, onnxruntime or openvino)
+    return create_backend(imgsz=YOLO_IMGSZ)
+
+
+def _warm_up_yolo(backend):
+    backend.predict([np.zeros((YOLO_IMGSZ, YOLO_IMGSZ, 3), dtype=np.uint8)])
+
+
+models.register("yolo", _load_yolo, _warm_up_yolo)
+
+
+class YoloBatchScheduler:
     """
-    Runs YOLO inference on the given image and returns the results.
+    Collects frames submitted by concurrent requests and runs them through
+    a single batched predict call. A batch is flushed when max_batch frames
+    are queued or when the oldest frame has waited max_wait_ms.
     """
-    return model.predict(image, imgsz=320, verbose=False)[0]
 
+    def __init__(self, max_batch: int = YOLO_BATCH_MAX, max_wait_ms: float = YOLO_BATCH_WAIT_MS):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._frames = 0
+        self._last_batch_size = 0
+        self._total_wait = 0.0
+        self._max_wait_seen = 0.0
 
-def detect_mobile_from_yolo(results, min_conf=0.5) -> bool:
+    def submit(self, image: np.ndarray) -> Future:
+        self._ensure_started()
+        future = Future()
+        self._queue.put((image, future, time.monotonic()))
+        return future
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="yolo-batcher", daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = batch[0][2] + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                # Once the window has passed, only drain what is already queued
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.monotonic()
+            waits = [started - enqueued for _, _, enqueued in batch]
+            try:
+                results = models.get("yolo").predict([image for image, _, _ in batch])
+                if len(results) != len(batch):
+                    # zip() would leave the unmatched requests waiting forever
+                    raise RuntimeError(f"YOLO returned {len(results)} result(s) for a batch of {len(batch)}")
+            except Exception as e:
+                logger.error(f"Batched YOLO inference failed: {str(e)}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+            with self._stats_lock:
+                self._batches += 1
+                self._frames += len(batch)
+                self._last_batch_size = len(batch)
+                self._total_wait += sum(waits)
+                self._max_wait_seen = max(self._max_wait_seen, max(waits))
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "enabled": True,
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000,
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "frames": self._frames,
+                "last_batch_size": self._last_batch_size,
+                "avg_batch_size": round(self._frames / self._batches, 2) if self._batches else 0,
+                "avg_wait_ms": round(self._total_wait / self._frames * 1000, 2) if self._frames else 0,
+                "max_wait_seen_ms": round(self._max_wait_seen * 1000, 2)
+            }
+
+
+batch_scheduler = YoloBatchScheduler() if YOLO_BATCH_MAX > 1 else None
+
+
+def get_yolo_results(image: np.ndarray) -> Detections:
     """
-    Detects if a mobile phone is present in YOLO results with filtering.
+    Runs YOLO inference on the given image and returns its detections.
+    Blocks until the micro-batch containing this frame has been processed.
+    """
+    if batch_scheduler is None:
+        return models.get("yolo").predict([image])[0]
+    return batch_scheduler.submit(image).result(timeout=YOLO_RESULT_TIMEOUT)
+
+
+def get_batch_stats() -> dict:
+    """Queue depth, batch size and wait-time counters for the YOLO scheduler."""
+    if batch_scheduler is None:
+        return {"enabled": False}
+    return batch_scheduler.stats()
+
+
+def resolve_class_ids(names_by_id: dict, names) -> np.ndarray:
+    """Resolve class names to model class IDs once, instead of per box."""
+    return np.array([cls for cls, name in names_by_id.items() if name.lower() in names], dtype=np.int64)
+
+
+@lru_cache(maxsize=1)
+def target_class_ids():
+    """(phone IDs, person IDs), resolved once the model has been loaded."""
+    names_by_id = models.get("yolo").names
+    return resolve_class_ids(names_by_id, MOBILE_CLASSES), resolve_class_ids(names_by_id, {PERSON_CLASS})
+
+# One-pass view of a YOLO result; boxes are float32 (K, 4) xyxy arrays
+DetectionSummary = namedtuple(
+    "DetectionSummary",
+    ["phone_detected", "person_count", "max_phone_conf", "max_person_conf", "phone_boxes", "person_boxes"]
+)
+
+
+def summarize_detections(results: Detections, min_conf=0.5, min_person_area=15000, class_ids=None) -> DetectionSummary:
+    """
+    Phone/person summary of one image's detections computed on the whole
+    cls/conf/xyxy arrays at once, whichever backend produced them. Phones
+    need conf >= min_conf; people additionally need a box area of at least
+    min_person_area pixels. Max confidences are taken over all boxes of the
+    class, before filtering. class_ids defaults to the loaded model's
+    (phone IDs, person IDs).
     """
-    for box in results.boxes:
-        cls = int(box.cls[0].item())
-        conf = box.conf[0].item()
-        name = model.names[cls].lower()
+    cls, conf, xyxy = results
+    if len(cls) == 0:
+        empty = np.zeros((0, 4), dtype=np.float32)
+        return DetectionSummary(False, 0, 0.0, 0.0, empty, empty)
+
+    phone_ids, person_ids = class_ids if class_ids is not None else target_class_ids()
+    is_phone = np.isin(cls, phone_ids)
+    is_person = np.isin(cls, person_ids)
+    confident = conf >= min_conf
+    areas = (xyxy[:, 2] - xyxy[:, 0]) * (xyxy[:, 3] - xyxy[:, 1])
+
+    phone_mask = is_phone & confident
+    person_mask = is_person & confident & (areas >= min_person_area)
 
-        if name in MOBILE_CLASSES and conf >= min_conf:
-            return True
-    return False
+    return DetectionSummary(
+        phone_detected=bool(phone_mask.any()),
+        person_count=int(person_mask.sum()),
+        max_phone_conf=float(conf[is_phone].max()) if is_phone.any() else 0.0,
+        max_person_conf=float(conf[is_person].max()) if is_person.any() else 0.0,
+        phone_boxes=xyxy[phone_mask],
+        person_boxes=xyxy[person_mask]
+    )
 
 
+def detect_mobile_from_yolo(results, min_conf=0.5) -> bool:
+    """
+    Detects if a mobile phone is present in YOLO results with filtering.
+    """
+    return summarize_detections(results, min_conf=min_conf).phone_detected
+
 
 def count_people(results, min_conf=0.5, min_area=15000) -> int:
     """
@@ -36,15 +211,4 @@ def count_people(results, min_conf=0.5, min_area=15000) -> int:
     - Ignores detections with low confidence.
     - Ignores very small bounding boxes.
     """
-    count = 0
-    for box in results.boxes:
-        cls = int(box.cls[0].item())
-        conf = box.conf[0].item()
-        name = model.names[cls].lower()
-
-        if name == PERSON_CLASS and conf >= min_conf:
-            x1, y1, x2, y2 = box.xyxy[0].tolist()
-            area = (x2 - x1) * (y2 - y1)
-            if area >= min_area:
-                count += 1
-    return count
+    return summarize_detections(results, min_conf=min_conf, min_person_area=min_area).person_count
@@ -12,11 +12,18 @@ sys.path.append(BASE_DIR)
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 
 
 # ✅ Correct import from app/api/v1/__init__.py
 from app.api.v1 import api_router
+from app.utils.inference_pool import inference_pool
+from app.db.session import mongo
+from app.db.event_sink import event_sink
+from app.db.violation_store import ensure_indexes
+from app.utils.log_sink import close_log_sinks
+from app.utils.model_registry import models
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -42,6 +49,52 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ✅ Start/stop the inference workers with the app
+@app.on_event("startup")
+def start_inference_pool():
+    inference_pool.start()
+
+
+@app.on_event("shutdown")
+def stop_inference_pool():
+    inference_pool.shutdown()
+
+
+# ✅ Load models in parallel (MODEL_PRELOAD), after every handler has registered its own
+@app.on_event("startup")
+def start_models():
+    models.start()
+
+
+# ✅ MongoDB connection pool + health monitor (before the hooks that use it)
+@app.on_event("startup")
+def start_mongo():
+    mongo.start()
+
+
+# ✅ Buffered Mongo writes: flush what is left before the process exits
+@app.on_event("startup")
+def start_event_sink():
+    ensure_indexes()
+    event_sink.start()
+
+
+@app.on_event("shutdown")
+def stop_event_sink():
+    event_sink.shutdown()
+
+
+# ✅ Flush buffered pose/cheating logs and finalize the current files
+@app.on_event("shutdown")
+def stop_log_sinks():
+    close_log_sinks()
+
+
+# ✅ Close the Mongo pool last, after buffered writes are flushed
+@app.on_event("shutdown")
+def stop_mongo():
+    mongo.stop()
+
 # ✅ Register all versioned API endpoints
 app.include_router(api_router, prefix="/api/v1")
 app.openapi_schema = None
@@ -52,5 +105,17 @@ app.openapi_schema = None
 def root():
     return {"message": "Proctoring system backend is live!"}
 
+
+# ✅ Readiness: 200 once every model is loaded and warmed up, 503 until then
+@app.get("/ready", tags=["System"])
+def ready():
+    workers = inference_pool.readiness()
+    is_ready = models.is_ready() and all(w["state"] == "ready" for w in workers.values())
+    states = {**models.states(), **workers}
+    return JSONResponse(
+        status_code=200 if is_ready else 503,
+        content={"ready": is_ready, "models": states}
+    )
+
 # Serve static files (like HTML, JS, CSS)
 app.mount("/static", StaticFiles(directory="frontend"), name="static")
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Make `app` importable when pytest is run as `pytest` rather than `python -m pytest`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
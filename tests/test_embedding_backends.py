@@ -0,0 +1,38 @@
+import importlib.util
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app.utils import embedding_backends
+from app.utils.embedding_backends import EMBEDDING_ONNX_MODEL, mean_pool
+from conftest import DATA_DIR
+
+
+def test_mean_pool_ignores_padding_and_normalises():
+    hidden = np.array([
+        [[1.0, 0.0], [3.0, 0.0], [100.0, 100.0]],  # last token is padding
+        [[0.0, 2.0], [0.0, 4.0], [0.0, 6.0]]
+    ], dtype=np.float32)
+    mask = np.array([[1, 1, 0], [1, 1, 1]], dtype=np.int64)
+
+    pooled = mean_pool(hidden, mask)
+
+    assert pooled.dtype == np.float32
+    assert pooled.tolist() == [[1.0, 0.0], [0.0, 1.0]]
+
+
+def test_mean_pool_of_all_padding_is_finite():
+    pooled = mean_pool(np.ones((1, 2, 3), dtype=np.float32), np.zeros((1, 2), dtype=np.int64))
+    assert np.isfinite(pooled).all()
+
+
+def test_onnx_similarities_match_pytorch():
+    for module in ("sentence_transformers", "onnxruntime", "tokenizers"):
+        if importlib.util.find_spec(module) is None:
+            pytest.skip(f"{module} is not installed")
+    if not os.path.exists(EMBEDDING_ONNX_MODEL):
+        pytest.skip(f"exported model {EMBEDDING_ONNX_MODEL} not found; run `python -m app.utils.embedding_backends export`")
+
+    assert embedding_backends.parity(EMBEDDING_ONNX_MODEL, questions_path=os.path.join(DATA_DIR, "questions.json"))
@@ -0,0 +1,69 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("faster_whisper")
+
+from app.utils import stt_stream
+from app.utils.stt_stream import TranscriptionStream
+
+SAMPLES_PER_CHUNK = 16000  # one second
+
+
+def _chunk(value: float) -> bytes:
+    return np.full(SAMPLES_PER_CHUNK, value, dtype=np.float32).tobytes()
+
+
+@pytest.fixture
+def stream(monkeypatch):
+    # Raw float32 "audio", speech in the first quarter of whatever is pending,
+    # and a transcriber that reports how many samples it was given
+    monkeypatch.setattr(stt_stream, "decode_audio_bytes", lambda data: np.frombuffer(data, dtype=np.float32))
+    monkeypatch.setattr(stt_stream, "get_speech_timestamps",
+                        lambda audio, options: [{"start": 0, "end": len(audio) // 4}])
+    monkeypatch.setattr(TranscriptionStream, "_transcribe", lambda self, audio: str(len(audio)))
+    return TranscriptionStream("candidate", 1)
+
+
+def test_ingest_commits_finished_segments(stream):
+    assert stream.ingest(_chunk(0)) == "10000"
+    assert stream.committed_samples == 10000
+
+
+def test_chunk_retried_after_whisper_failure_is_not_duplicated(stream, monkeypatch):
+    stream.ingest(_chunk(0))
+
+    transcribe = TranscriptionStream._transcribe
+    calls = []
+
+    def fail_once(self, audio):
+        calls.append(len(audio))
+        if len(calls) == 1:
+            raise RuntimeError("whisper failed")
+        return transcribe(self, audio)
+
+    monkeypatch.setattr(TranscriptionStream, "_transcribe", fail_once)
+    with pytest.raises(RuntimeError):
+        stream.ingest(_chunk(1))
+    assert len(stream.buffer) == len(_chunk(0))
+    assert (stream.committed_samples, stream.transcript) == (10000, "10000")
+
+    # Same audio as before the failure: 6000 uncommitted samples plus the chunk
+    assert stream.ingest(_chunk(1)) == "10000 13750"
+    assert calls == [13750, 13750]
+    assert len(stream.buffer) == 2 * len(_chunk(0))
+
+
+def test_finish_retried_after_failure_is_not_duplicated(stream, monkeypatch):
+    stream.ingest(_chunk(0))
+    transcribe = TranscriptionStream._transcribe
+
+    def fail(self, audio):
+        raise RuntimeError("whisper failed")
+
+    monkeypatch.setattr(TranscriptionStream, "_transcribe", fail)
+    with pytest.raises(RuntimeError):
+        stream.finish(_chunk(1))
+    assert len(stream.buffer) == len(_chunk(0)) and not stream.finished
+
+    monkeypatch.setattr(TranscriptionStream, "_transcribe", transcribe)
+    assert stream.finish(_chunk(1)) == "10000 22000"
@@ -0,0 +1,77 @@
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+pymongo = pytest.importorskip("pymongo")
+pytest.importorskip("motor")
+
+from bson import ObjectId
+from pymongo.errors import PyMongoError
+
+from app.db.violation_store import EVENTS_COLLECTION, SUMMARY_COLLECTION, migrate_summaries
+
+
+@pytest.fixture
+def db():
+    """A throwaway database on MONGO_URL; skipped when no server is reachable."""
+    client = pymongo.MongoClient(os.getenv("MONGO_URL", "mongodb://localhost:27017"), serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        pytest.skip("MongoDB is not reachable")
+    name = f"test_violation_store_{uuid.uuid4().hex[:8]}"
+    yield client[name]
+    client.drop_database(name)
+    client.close()
+
+
+def _tab_doc(candidate_id: str, logged_at: datetime) -> dict:
+    # What the old /log_tab_violation inserted into cheating_logs for every event
+    return {
+        "_id": ObjectId(),
+        "candidate_id": candidate_id,
+        "type": "tab_violation",
+        "reason": "Switched tab",
+        "timestamp": logged_at.isoformat() + "Z",
+        "logged_at": logged_at
+    }
+
+
+def test_migration_moves_legacy_tab_events_without_losing_any(db):
+    summaries, events = db[SUMMARY_COLLECTION], db[EVENTS_COLLECTION]
+    start = datetime(2024, 5, 1, 9, 0)
+    summaries.insert_many([
+        # Old-style summary plus a duplicate left by a concurrent first upsert
+        {"candidate_id": "a", "candidate_name": "Ann", "cheating_type": "Head turned too far, Multiple faces",
+         "timestamp": start, "details": {"warnings": {"Head turned too far": 2, "Multiple faces": 1}}},
+        {"candidate_id": "a", "candidate_name": "Ann", "cheating_type": "Head turned too far",
+         "timestamp": start + timedelta(minutes=1), "details": {"warnings": {"Head turned too far": 1}}}
+    ])
+    tab_docs = [_tab_doc("a", start + timedelta(minutes=m)) for m in (2, 3)]
+    tab_docs += [_tab_doc("b", start + timedelta(minutes=m)) for m in (4, 5, 6)]
+    summaries.insert_many(tab_docs)
+
+    migrate_summaries(summaries, events)
+    migrate_summaries(summaries, events)  # a second run must change nothing
+
+    moved = list(events.find({"type": "tab_violation"}))
+    assert sorted(e["_id"] for e in moved) == sorted(d["_id"] for d in tab_docs)
+    assert all(isinstance(e["timestamp"], datetime) for e in moved)
+    assert all(e["details"]["reason"] == "Switched tab" for e in moved)
+    assert summaries.count_documents({"type": "tab_violation"}) == 0
+
+    a = list(summaries.find({"candidate_id": "a"}))
+    assert len(a) == 1
+    assert a[0]["total_violations"] == 3 + 1 + 2
+    assert a[0]["details"]["warnings"]["tab_violation"] == 2
+    assert a[0]["cheating_types"] == ["Head turned too far", "Multiple faces", "tab_violation"]
+    assert a[0]["cheating_type"] == "Head turned too far, Multiple faces, tab_violation"
+
+    b = list(summaries.find({"candidate_id": "b"}))
+    assert len(b) == 1
+    assert b[0]["total_violations"] == 3
+    assert b[0]["cheating_types"] == ["tab_violation"]
+    assert b[0]["timestamp"] == start + timedelta(minutes=6)
+    assert b[0]["first_violation_at"] == start + timedelta(minutes=4)
@@ -0,0 +1,87 @@
+import glob
+import importlib.util
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from app.utils import yolo_backends
+from app.utils.yolo_backends import CONF_THRESHOLD, DEFAULT_MODEL_PATHS, YOLO_WEIGHTS, letterbox, nms, postprocess
+from conftest import DATA_DIR
+
+FRAMES_DIR = os.path.join(DATA_DIR, "frames")
+
+
+def _head_output(boxes, num_classes=80):
+    """Raw YOLOv8 head layout (4 + num_classes, anchors) from (cx, cy, w, h, cls, conf) rows."""
+    output = np.zeros((4 + num_classes, len(boxes)), dtype=np.float32)
+    for i, (cx, cy, w, h, cls, conf) in enumerate(boxes):
+        output[:4, i] = (cx, cy, w, h)
+        output[4 + cls, i] = conf
+    return output
+
+
+def test_letterbox_keeps_aspect_and_pads_evenly():
+    img = np.full((480, 640, 3), 50, dtype=np.uint8)
+    boxed, gain, (pad_x, pad_y) = letterbox(img, 320)
+    assert boxed.shape == (320, 320, 3)
+    assert gain == pytest.approx(0.5)
+    assert (pad_x, pad_y) == (0, 40)
+    assert (boxed[:40] == yolo_backends.PAD_VALUE).all()
+    assert (boxed[40:280] == 50).all()
+    assert (boxed[280:] == yolo_backends.PAD_VALUE).all()
+
+
+def test_nms_drops_overlaps_and_keeps_best_first():
+    boxes = np.array([[0, 0, 10, 10], [1, 1, 11, 11], [50, 50, 60, 60]], dtype=np.float32)
+    scores = np.array([0.6, 0.9, 0.5], dtype=np.float32)
+    assert nms(boxes, scores, 0.5).tolist() == [1, 2]
+    assert nms(boxes, scores, 0.99).tolist() == [1, 0, 2]
+
+
+def test_postprocess_filters_suppresses_per_class_and_unletterboxes():
+    output = _head_output([
+        (100, 140, 40, 40, 0, 0.9),   # person
+        (102, 142, 40, 40, 0, 0.8),   # same person, suppressed
+        (102, 142, 40, 40, 67, 0.7),  # phone on top of it: another class, kept
+        (200, 200, 20, 20, 0, CONF_THRESHOLD / 2)  # below the confidence threshold
+    ])
+    detections = postprocess(output, gain=0.5, pad=(0, 40), shape=(480, 640))
+
+    assert detections.cls.tolist() == [0, 67]
+    assert detections.conf.tolist() == pytest.approx([0.9, 0.7])
+    # (cx 100, cy 140, 40x40) in the 320px letterbox -> original 640x480 pixels
+    assert detections.xyxy[0].tolist() == pytest.approx([160, 160, 240, 240])
+
+
+def test_postprocess_clips_to_the_image_and_handles_no_detections():
+    output = _head_output([(5, 45, 20, 20, 0, 0.9)])
+    detections = postprocess(output, gain=0.5, pad=(0, 40), shape=(480, 640))
+    assert detections.xyxy[0].tolist() == pytest.approx([0, 0, 30, 30])
+
+    empty = postprocess(_head_output([]), gain=0.5, pad=(0, 40), shape=(480, 640))
+    assert len(empty.cls) == 0 and empty.xyxy.shape == (0, 4)
+
+
+def _parity_frames() -> list:
+    frames = sorted(glob.glob(os.path.join(FRAMES_DIR, "*")))
+    # ultralytics ships two photos with people in them; use them when installed
+    from ultralytics.utils import ASSETS
+    frames += [str(ASSETS / name) for name in ("bus.jpg", "zidane.jpg") if (ASSETS / name).exists()]
+    return frames
+
+
+@pytest.mark.parametrize("backend, runtime", [("onnxruntime", "onnxruntime"), ("openvino", "openvino")])
+def test_exported_backend_matches_pytorch(backend, runtime):
+    pytest.importorskip("ultralytics")
+    if importlib.util.find_spec(runtime) is None:
+        pytest.skip(f"{runtime} is not installed")
+    if not os.path.exists(YOLO_WEIGHTS):
+        pytest.skip(f"PyTorch weights {YOLO_WEIGHTS} not found")
+    path = os.getenv("YOLO_MODEL_PATH") or DEFAULT_MODEL_PATHS[backend]
+    if not os.path.exists(path):
+        pytest.skip(f"exported model {path} not found; run `python -m app.utils.yolo_backends export`")
+
+    assert yolo_backends.parity(backend, _parity_frames(), path=path)